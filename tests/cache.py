@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from hashlib import sha256
+from os import getpid, sep
+from pathlib import Path
+from marshal import dumps, loads
+from typing import Any, Dict, Tuple, Union
+
+from yaml import load
+
+try:
+    from yaml import CSafeLoader as SafeLoader  # ? libyaml's loader is an order of magnitude faster than the pure Python one
+except ImportError:
+    from yaml import SafeLoader  # type: ignore
+
+# ? Stored with marshal, which only handles plain data, so that a file planted in the shared /tmp can't run code when it is loaded
+CACHE_PATH = Path(sep, "tmp", "tests", "yaml-cache")
+
+# ? Documents already loaded by this process, keyed by their path and content hash
+LOADED: Dict[Tuple[str, str], Any] = {}
+
+
+def load_yaml(path: Union[str, Path], cache_path: Path = CACHE_PATH) -> Any:
+    """Load a YAML file, reusing the parsed document cached for the same content by a previous run if there is one.
+
+    Only the hash of the content is computed when the file didn't change, a copy of the document is returned every time so that
+    callers can modify it freely."""
+    content = Path(path).read_bytes()
+    digest = sha256(content).hexdigest()
+
+    key = (str(path), digest)
+    if key in LOADED:
+        return loads(LOADED[key])
+
+    cached = cache_path.joinpath(f"{digest}.marshal")
+    if cached.is_file():
+        try:
+            data = cached.read_bytes()
+            document = loads(data)
+            LOADED[key] = data
+            return document
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+
+    document = load(content, Loader=SafeLoader)
+    try:
+        data = dumps(document)
+    except ValueError:  # ? Documents holding timestamps can't be marshalled, they are parsed every time
+        return document
+    LOADED[key] = data
+
+    try:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        # ? Written under a temporary name first so that concurrent runs never read a partial file
+        tmp = cache_path.joinpath(f"{digest}.{getpid()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(cached)
+    except OSError:
+        pass
+
+    return document
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from hashlib import sha256
+from logging import getLogger
+from os.path import join
+from pathlib import Path
+from marshal import dumps, loads
+from typing import Any, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from cache import load_yaml
+from slot import get_slot
+from stack import get_base_config, get_config_hash, get_effective_config, get_effective_labels
+
+LOGGER = getLogger("COMPILED_PLAN")
+
+# ? Bumped whenever the layout of the plan changes, so that an old plan is never loaded
+PLAN_VERSION = 2
+# ? Stored with marshal, the actions as their fields, so that a file planted in the shared /tmp can't run code when it is loaded
+PLAN_PATH = get_slot().tmp_path.joinpath("plan.marshal")
+PLAN_INTEGRATIONS = ("Docker", "Linux", "Autoconf")  # TODO: Add Swarm and Kubernetes
+
+# ? Loaded plans, keyed by their test type and file, so that each process reads the plan at most once
+PLANS: Dict[tuple, Optional[Dict[str, Any]]] = {}
+
+
+def get_sources(test_type: str, filename: str) -> Dict[str, str]:
+    """Hash every file the compiled plan depends on: the test file, the base config and the code building the actions and configs"""
+    paths = (join("tests", test_type, f"{filename}.yml"), join("tests", "config.yml"), join("tests", "models.py"), join("tests", "stack.py"))
+    return {path: sha256(Path(path).read_bytes()).hexdigest() for path in paths if Path(path).is_file()}
+
+
+def compile_plan(test_type: str, filename: str, data: Optional[dict] = None) -> Dict[str, Any]:
+    """Validate every action of a test file and compute their effective config and labels for each integration.
+
+    Invalid actions are left out of the plan, the steps using them fall back to the test file and report the error themselves."""
+    if data is None:
+        data = load_yaml(Path("tests", test_type, f"{filename}.yml")) or {}
+    base_configs = {integration: get_base_config(integration) for integration in PLAN_INTEGRATIONS}
+
+    plan = {
+        "version": PLAN_VERSION,
+        "type": test_type,
+        "file": filename,
+        "sources": get_sources(test_type, filename),
+        "declared": list(data.get("actions", {})),
+        "actions": {},
+        "stacks": {integration: {} for integration in PLAN_INTEGRATIONS},
+    }
+
+    for action_str, action_data in data.get("actions", {}).items():
+        try:
+            class_ = getattr(__import__("models"), (action_data or {}).get("type", "").title())
+            action = class_(**action_data)
+        except (AttributeError, TypeError, ValidationError) as e:
+            LOGGER.warning(f"Action {action_str} has invalid data, leaving it out of the plan: {e}")
+            continue
+
+        plan["actions"][action_str] = action
+        for integration in PLAN_INTEGRATIONS:
+            config = get_effective_config(data, action, integration, base_configs[integration])
+            labels = get_effective_labels(data, action, integration)
+            plan["stacks"][integration][action_str] = {"config": config, "labels": labels, "hash": get_config_hash(config, labels)}
+
+    return plan
+
+
+def save_plan(plan: Dict[str, Any], path: Path = PLAN_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(dumps(plan | {"actions": {action_str: action.model_dump(exclude_unset=True) for action_str, action in plan["actions"].items()}}))
+
+
+def load_plan(test_type: str, filename: str, path: Path = PLAN_PATH) -> Optional[Dict[str, Any]]:
+    """Return the compiled plan of a test file, or None if there is none or it is stale, in which case the test file must be parsed"""
+    key = (test_type, filename, str(path))
+    if key in PLANS:
+        return PLANS[key]
+
+    plan = None
+    if path.is_file():
+        try:
+            plan = loads(path.read_bytes())
+        except (ValueError, EOFError, TypeError):
+            LOGGER.warning(f"Compiled plan {path} can't be loaded, ignoring it")
+
+    if plan is not None and (plan.get("version") != PLAN_VERSION or plan.get("type") != test_type or plan.get("file") != filename):
+        LOGGER.debug(f"Compiled plan {path} doesn't match {test_type}/{filename}.yml, ignoring it")
+        plan = None
+    elif plan is not None and plan.get("sources") != get_sources(test_type, filename):
+        LOGGER.warning(f"Compiled plan {path} is stale, one of its source files changed since it was compiled, ignoring it")
+        plan = None
+
+    if plan is not None:
+        # ? The actions are stored as the fields they were given, validating them again rebuilds their nested models
+        models = __import__("models")
+        plan["actions"] = {action_str: getattr(models, fields["type"].title()).model_validate(fields) for action_str, fields in plan["actions"].items()}
+
+    PLANS[key] = plan
+    return plan
+
+
+def get_planned_actions(plan: Optional[Dict[str, Any]], action_strs: List[str]) -> Optional[Dict[str, Any]]:
+    """Return the validated actions from the plan, or None if one of them isn't in it"""
+    if plan is None or any(action_str not in plan["actions"] for action_str in action_strs):
+        return None
+    return {action_str: plan["actions"][action_str] for action_str in action_strs}
@@ -2,28 +2,50 @@
 # -*- coding: utf-8 -*-
 
 from argparse import ArgumentParser
+from asyncio import Semaphore, Task, create_task, gather, run as run_async, sleep as async_sleep, to_thread, wait
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from datetime import timedelta
-from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
+from hashlib import sha256
+from json import dumps
+from logging import DEBUG, ERROR, INFO, WARNING, LogRecord, addLevelName, basicConfig, getLogger
 from os import getenv
 from os.path import join
 from pathlib import Path
-from re import match
+from queue import Empty, Queue
+from re import compile as re_compile, match
 from socket import create_connection
-from ssl import CERT_NONE, DER_cert_to_PEM_cert, create_default_context
-from time import sleep
+from statistics import median
+from ssl import CERT_NONE, HAS_TLSv1, HAS_TLSv1_1, HAS_TLSv1_2, HAS_TLSv1_3, DER_cert_to_PEM_cert, PEM_cert_to_DER_cert, TLSVersion, create_default_context
+from time import monotonic, sleep
 from traceback import format_exc
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
-from httpx import Client, Response
+from httpx import AsyncClient, AsyncHTTPTransport, Client, Request, Response
 from pydantic import ValidationError
+from redis import Redis
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.ui import WebDriverWait  # type: ignore
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from yaml import safe_load
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from cache import load_yaml
+from compiled import get_planned_actions, load_plan
+from load import run_load, run_train
+from logs import LOGS_PATH, LogTails
+from matcher import CHUNK_SIZE, BodyMatcher
+from models import Action
+from slot import get_slot
+from stack import PACKING_SERVERS
+from timing import RequestTracer, write_samples
+from upload import BodyStream
 
 basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
 
@@ -36,152 +58,535 @@ addLevelName(WARNING, "⚠️ ")
 LOGGER = getLogger("CORE_TEST")
 
 parser = ArgumentParser(prog="Tests runner", description="Run a test.")
-parser.add_argument("test", type=str, help="Test to run")
+parser.add_argument("test", type=str, help='Test to run ("file;action"), or only the file when using --batch')
+parser.add_argument("--batch", action="store_true", help="Run every action of the file in a single process")
+parser.add_argument(
+    "--actions",
+    type=str,
+    help="Comma separated list of actions to run in batch mode (default: all of them), groups packed on the same stack are separated by semicolons",
+)
+parser.add_argument("--parallel", type=int, default=1, help="Maximum number of actions run concurrently in batch mode, above 1 the asyncio engine is used")
+parser.add_argument("--converge", action="store_true", help="Retry every check until it passes or its timeout is reached instead of waiting for its delay")
+parser.add_argument("--report", type=str, default=join(get_slot().tmp_path, "report.json"), help="Path of the per-action report written in batch mode")
+parser.add_argument("--timings", type=str, default=join(get_slot().tmp_path, "timings.jsonl"), help="Path of the JSONL file the per-request timings are appended to")
+parser.add_argument("--integration", type=str, default="", help="Integration being tested, used to tag the timings and to know where the logs are")
 ARGS = parser.parse_args()
 
-test_split = ARGS.test.split(";")
-filename = test_split[0]
-action_str = test_split[1]
+SLOT = get_slot()
 
-LOGGER.info(f"🚀 Running {filename} / {action_str} test")
+# ? Tails of the stack's logs, their positions are shared with the other actions of the run, even the ones run by another process
+LOG_TAILS = LogTails(SLOT.tmp_path.joinpath("log-positions.json"), ARGS.integration != "Linux" if ARGS.integration else not LOGS_PATH.is_dir(), SLOT.suffix)
+# ? Interval between two reads of a log waited on
+LOG_POLL_INTERVAL = 0.25
 
-file_path = join("tests", "core", f"{filename}.yml")
+# ? Pooled connections to the stack's Redis servers and databases, keyed by their URL and shared by the actions of the run
+REDIS_CLIENTS: Dict[str, Redis] = {}
+ENGINES: Dict[str, Engine] = {}
+# ? Maximum number of keys whose TTL is checked, the other matching keys are only counted
+MAX_TTL_CHECKS = 1000
 
-data = safe_load(Path(file_path).read_text())
+# ? Backoff between two attempts of a converging action, doubled after each failed attempt
+CONVERGE_BACKOFF = 0.5
+CONVERGE_MAX_BACKOFF = 8.0
 
-action_data = data["actions"][action_str]
-action_type = action_data["type"]
+# ? Pooled HTTP clients, keyed by the settings that can't be changed per request and whether they upload bodies
+CLIENTS: Dict[Tuple[bool, bool, Optional[Tuple[str, str]], bool, bool], Client] = {}
+# ? Pooled transports of the asyncio engine, auth and redirects are set per client
+TRANSPORTS: Dict[Tuple[bool, bool], AsyncHTTPTransport] = {}
 
-try:
-    class_ = getattr(__import__("models"), action_type.title())
-    action = class_(**action_data)
-except ValidationError:
-    LOGGER.exception(f"Action {action_str} has invalid data")
-    exit(1)
+# ? Parsed certificates, keyed by their SHA-256 fingerprint
+CERTIFICATES: Dict[bytes, x509.Certificate] = {}
+# ? TLS versions that can be probed, and whether our OpenSSL is able to offer them
+TLS_VERSIONS = {
+    "TLSv1": (TLSVersion.TLSv1, HAS_TLSv1),
+    "TLSv1.1": (TLSVersion.TLSv1_1, HAS_TLSv1_1),
+    "TLSv1.2": (TLSVersion.TLSv1_2, HAS_TLSv1_2),
+    "TLSv1.3": (TLSVersion.TLSv1_3, HAS_TLSv1_3),
+}
 
-if action.delay > 0:
-    LOGGER.info(f"⏲ Waiting {action.delay} seconds ...")
-    sleep(action.delay)
+# ? Idle headless browsers, reused across actions, and every browser started so far
+DRIVERS: Queue = Queue()
+STARTED_DRIVERS: List[webdriver.Firefox] = []
 
-LOGGER.info(f"📡 Starting {action.type} test ...")
+# ? Log records of the attempt being run, held back until we know if they are relevant
+HELD_RECORDS: ContextVar[Optional[List[LogRecord]]] = ContextVar("HELD_RECORDS", default=None)
+# ? File and action being run, used to tag the timings of their requests
+CURRENT_ACTION: ContextVar[Tuple[str, str]] = ContextVar("CURRENT_ACTION", default=("", ""))
 
-if action.type not in ("xpath", "cookie"):
-    response = None
 
-    LOGGER.info(f"Sending {action.method} request to {action.url} ...")
-    LOGGER.debug(f"Request headers: {action.headers}")
-    LOGGER.debug(f"Request auth: {action.auth}")
-    LOGGER.debug(f"Allowing redirects: {action.follow_redirects}")
-    LOGGER.debug(f"Verifying SSL: {action.verify_ssl}")
+def hold_records(record: LogRecord) -> bool:
+    """Hold back the log records emitted while an attempt is being run"""
+    records = HELD_RECORDS.get()
+    if records is None:
+        return True
+    records.append(record)
+    return False
 
-    try:
-        with Client(
+
+# ? Set on the handlers rather than on LOGGER, so that the records of the libraries (httpx, ...) are held back with ours and replayed in order
+for handler in getLogger().handlers:
+    handler.addFilter(hold_records)
+
+
+def load_actions(filename: str, action_strs: Optional[List[str]] = None) -> Dict[str, Action]:
+    """Load the requested actions from the compiled plan, or read and validate them from the test file, and check their dependencies up front"""
+    plan = load_plan("core", filename)
+    if plan is not None and (actions := get_planned_actions(plan, action_strs or plan["declared"])) is not None:
+        LOGGER.debug(f"Using the compiled plan of {filename}.yml")
+        declared = plan["declared"]
+    else:
+        actions, declared = parse_actions(filename, action_strs)
+
+    valid = True
+    for action_str, action in actions.items():
+        for after in action.after:
+            if after not in declared[: declared.index(action_str)]:
+                LOGGER.error(f"Action {action_str} must run after {after}, but it isn't declared before it in {filename}.yml")
+                valid = False
+
+    if not valid:
+        exit(1)
+
+    # ? The stacks of the other slots are published on their own ports and networks
+    if SLOT.index:
+        for action_str, action in actions.items():
+            actions[action_str] = action.model_copy(update={"url": SLOT.rewrite_url(action.url), "headers": SLOT.rewrite(action.headers)})
+
+    return actions
+
+
+def parse_actions(filename: str, action_strs: Optional[List[str]] = None) -> Tuple[Dict[str, Action], List[str]]:
+    """Read the test file and validate the requested actions, exit if one of them is invalid"""
+    file_path = join("tests", "core", f"{filename}.yml")
+
+    LOGGER.debug(f"Reading {file_path}")
+    data = load_yaml(file_path)
+
+    actions = {}
+    valid = True
+    for action_str in action_strs or data["actions"]:
+        action_data = data["actions"].get(action_str)
+
+        if not action_data:
+            LOGGER.error(f"Action {action_str} not found in {filename}.yml")
+            valid = False
+            continue
+
+        try:
+            class_ = getattr(__import__("models"), action_data["type"].title())
+            actions[action_str] = class_(**action_data)
+        except ValidationError:
+            LOGGER.exception(f"Action {action_str} has invalid data")
+            valid = False
+
+    if not valid:
+        exit(1)
+
+    return actions, list(data["actions"])
+
+
+def get_client(action: Action) -> Client:
+    """Return the pooled HTTP client matching the action's settings"""
+    # ? Uploads never share their connections, so that the connection they are sent on is always traced
+    key = (action.http2, action.verify_ssl, action.auth, action.follow_redirects, action.body_length > 0)
+
+    if key not in CLIENTS:
+        LOGGER.debug(f"Creating a new HTTP client for {key}")
+        CLIENTS[key] = Client(
             auth=action.auth,
-            headers=action.headers,
             verify=action.verify_ssl,
             http1=not action.http2,
             http2=action.http2,
             timeout=10,
             follow_redirects=action.follow_redirects,
-        ) as client:
-            response = client.request(action.method, action.url, data="a" * action.body_length if action.body_length > 0 else None)
+            event_hooks={"response": [capture_tls]},
+        )
+
+    client = CLIENTS[key]
+    client.cookies.clear()  # ? Cookies must not leak from one action to another
+    return client
+
+
+def log_request(action: Action):
+    """Log the request about to be sent for an action"""
+    LOGGER.info(f"Sending {action.method} request to {action.url} ...")
+    LOGGER.debug(f"Request headers: {action.headers}")
+    LOGGER.debug(f"Request auth: {action.auth}")
+    LOGGER.debug(f"Allowing redirects: {action.follow_redirects}")
+    LOGGER.debug(f"Verifying SSL: {action.verify_ssl}")
+
+
+def build_request(client: Union[Client, AsyncClient], action: Action, tracer: RequestTracer) -> Tuple[Request, Optional[BodyStream]]:
+    """Build the action's request, its body (if any) being generated while it is sent.
+
+    With HTTP/1.1, the body watches the connection it is sent on to know when the server answered, as the response is only read
+    once the whole body is sent. Uploads are sent with Connection: close so that each of them is sent on a new, traced, connection."""
+    headers = dict(action.headers)
+    body = None
+    if action.body_length > 0:
+        body = BodyStream(action.body_length, None if action.http2 else tracer.get_socket)
+        headers |= body.get_headers(action.body_chunked)
+        if not action.http2:
+            headers["Connection"] = "close"
+
+    request = client.build_request(
+        action.method,
+        action.url,
+        headers=headers,
+        content=body,
+        extensions={"trace": tracer.trace_async if isinstance(client, AsyncClient) else tracer},
+    )
+    return request, body
+
+
+def log_upload(body: Optional[BodyStream], response: Union[Response, str]):
+    """Log how much of the body was sent and how fast, and where it was rejected if it was"""
+    if body is None or body.started is None:
+        return
+
+    throughput = f" at {body.throughput / 1024 / 1024:.2f} MiB/s" if body.throughput else ""
+    if isinstance(response, Response) and response.status_code == 413:
+        LOGGER.info(f"Body rejected with a 413 status code after {body.answered_at if body.answered_at is not None else body.sent} / {body.length} bytes were sent{throughput}")
+    elif body.answered_at is not None and not body.complete:
+        LOGGER.info(f"Server answered after {body.answered_at} / {body.length} bytes were sent, the upload stopped after {body.sent} bytes{throughput}")
+    elif body.complete:
+        LOGGER.info(f"Body of {body.length} bytes sent{throughput}")
+    else:
+        LOGGER.info(f"Upload stopped after {body.sent} / {body.length} bytes were sent{throughput}")
+
+
+def save_timings(tracer: RequestTracer, request: Request, response: Union[Response, str], body: Optional[BodyStream] = None):
+    """Append the timings of a traced request to the timings file, even when it failed so that timeouts can be investigated"""
+    category, action_str = CURRENT_ACTION.get()
+    error = response if isinstance(response, str) else None
+    upload = {"body_sent": body.sent, "body_answered_at": body.answered_at, "upload_throughput": round(body.throughput, 3) if body.throughput else None} if body else {}
+
+    try:
+        write_samples(
+            Path(ARGS.timings),
+            tracer,
+            request,
+            None if error else response,
+            error.strip().splitlines()[-1] if error else None,
+            category=category,
+            action=action_str,
+            integration=ARGS.integration,
+            **upload,
+        )
+    except Exception:
+        LOGGER.warning(f"Couldn't save the timings of the request to {request.url}: {format_exc()}")
+
+    for sample in tracer.samples():
+        LOGGER.debug(f"Timings (ms): {', '.join(f'{key}={value}' for key, value in sample.items() if value is not None)}")
+
+
+def get_matcher(action: Action) -> Optional[BodyMatcher]:
+    """Return a fresh body matcher for the patterns of a string action, None for the other actions"""
+    if action.type != "string":
+        return None
+    return BodyMatcher(([action.string] if action.string is not None else []) + action.strings, action.forbidden_strings, action.strings_rx, action.forbidden_strings_rx)
+
+
+def send_request(action: Action, matcher: Optional[BodyMatcher] = None) -> Union[Response, str]:
+    """Send the action's request and return the response, or the formatted exception if it failed.
+
+    With a matcher, the body is streamed through it and only read until the outcome is known, it isn't kept in the response."""
+    log_request(action)
+
+    client = get_client(action)
+    tracer = RequestTracer()
+    request, body = build_request(client, action, tracer)
+
+    response: Union[Response, str]
+    try:
+        response = client.send(request, stream=matcher is not None)
+        if matcher is not None:
+            try:
+                for chunk in response.iter_text(CHUNK_SIZE):
+                    matcher.feed(chunk)
+                    if matcher.done:
+                        break
+            finally:
+                response.close()
     except Exception:
         response = format_exc()
 
+    log_upload(body, response)
+    save_timings(tracer, request, response, body)
+    return response
+
+
+def check_response(action: Action, response: Union[Response, str], matcher: Optional[BodyMatcher] = None) -> bool:
+    """Check the response of a request based action, string actions need the matcher their body was streamed through"""
     if isinstance(response, Response):
-        LOGGER.debug(f"Response: {response.text}")
+        if matcher is None:
+            LOGGER.debug(f"Response: {response.text}")
+        else:
+            LOGGER.debug(f"Response: {matcher.scanned} characters scanned{'' if response.is_stream_consumed else ', the rest of the body was skipped'}")
         LOGGER.debug(f"Response URL: {response.url}")
         LOGGER.debug(f"Response status code: {response.status_code}")
         LOGGER.debug(f"Response headers: {response.headers}")
 
         if action.http2 and response.http_version != "HTTP/2":
-            LOGGER.error(f"HTTP/2 not used, instead found {response.http_version}, exiting ...")
-            exit(1)
+            LOGGER.error(f"HTTP/2 not used, instead found {response.http_version}")
+            return False
+    elif action.type != "status":
+        LOGGER.error(f"Request failed:\n{response}")
+        return False
 
     if action.type == "string":
-        assert isinstance(response, Response), f"❌ Request failed:\n{response}"
         response.raise_for_status()
-        if action.string not in response.text:
-            LOGGER.error(f"String {action.string} not found in response, exiting ...")
-            exit(1)
-        LOGGER.info(f"String {action.string} found in response")
+        for pattern in matcher.forbidden_found:
+            LOGGER.error(f"Forbidden string {pattern} found in response")
+        for pattern in matcher.missing:
+            LOGGER.error(f"String {pattern} not found in response")
+        if matcher.forbidden_found or matcher.missing:
+            return False
+        for pattern in matcher.required + matcher.required_rx:
+            LOGGER.info(f"String {pattern} found in response")
+        if matcher.forbidden or matcher.forbidden_rx:
+            LOGGER.info(f"None of the forbidden strings {', '.join(matcher.forbidden + matcher.forbidden_rx)} found in response")
     elif action.type == "path":
-        assert isinstance(response, Response), f"❌ Request failed:\n{response}"
         if action.path not in str(response.url):
             response.raise_for_status()
-            LOGGER.error(f"Path {action.path} not found in response URL, instead found {response.url}, exiting ...")
-            exit(1)
+            LOGGER.error(f"Path {action.path} not found in response URL, instead found {response.url}")
+            return False
         LOGGER.info(f"Path {action.path} found in response URL")
     elif action.type == "status":
         if isinstance(response, str):
             if action.status:
-                LOGGER.error(f"Request failed, expected status code {action.status}, exiting ...")
-                exit(1)
+                LOGGER.error(f"Request failed, expected status code {action.status}")
+                return False
             LOGGER.info("Request failed, as expected")
         else:
             if not action.status:
-                LOGGER.error("Request succeeded, expected failure, exiting ...")
-                exit(1)
+                LOGGER.error("Request succeeded, expected failure")
+                return False
             elif action.status != response.status_code:
-                LOGGER.error(f"Status code {action.status} not found in response, instead found {response.status_code}, exiting ...")
-                exit(1)
+                LOGGER.error(f"Status code {action.status} not found in response, instead found {response.status_code}")
+                return False
             LOGGER.info(f"Status code {action.status} found in response")
     elif action.type == "header":
-        assert isinstance(response, Response), f"❌ Request failed:\n{response}"
         response.raise_for_status()
         header = response.headers.get(action.header_name, None)
         if header is not None:
             if action.header_rx is None:
-                LOGGER.error(f"Header {action.header_name} found in response, exiting ...\nheaders: {response.headers}")
-                exit(1)
+                LOGGER.error(f"Header {action.header_name} found in response\nheaders: {response.headers}")
+                return False
             elif not match(action.header_rx, header):
-                LOGGER.error(f"Header {action.header_name} with regex {action.header_rx} not found in response, exiting ...\nheaders: {response.headers}")
-                exit(1)
+                LOGGER.error(f"Header {action.header_name} with regex {action.header_rx} not found in response\nheaders: {response.headers}")
+                return False
             LOGGER.info(f"Header {action.header_name} with regex {action.header_rx} matched in response")
         elif action.header_rx is not None:
-            LOGGER.error(f"Header {action.header_name} with regex {action.header_rx} not found in response, exiting ...\nheaders: {response.headers}")
-            exit(1)
+            LOGGER.error(f"Header {action.header_name} with regex {action.header_rx} not found in response\nheaders: {response.headers}")
+            return False
         else:
             LOGGER.info(f"Header {action.header_name} not found in response")
     elif action.type == "ssl":
-        assert isinstance(response, Response), f"❌ Request failed:\n{response}"
         response.raise_for_status()
         if response.url.scheme != "https":
-            LOGGER.error("Response URL scheme is not HTTPS, exiting ...")
-            exit(1)
-
-        ssl_context = create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = CERT_NONE
-        with create_connection((response.url.host, 443)) as conn:
-            with ssl_context.wrap_socket(conn, server_hostname=response.url.host) as ssl_socket:
-                LOGGER.debug(f"Response SSL version: {ssl_socket.version()}")
-                LOGGER.debug(f"Response SSL cipher: {ssl_socket.cipher()}")
-                LOGGER.debug(f"Response SSL compression: {ssl_socket.compression()}")
-                LOGGER.debug(f"Response SSL shared ciphers: {ssl_socket.shared_ciphers()}")
-                LOGGER.debug(f"Response SSL server certificate binary: {ssl_socket.getpeercert(True)}")
-                if ssl_socket.version() not in action.ssl_protocols:
-                    LOGGER.error(f"SSL version {ssl_socket.version()} not found in response, exiting ...")
-                    exit(1)
-                pem_data = DER_cert_to_PEM_cert(ssl_socket.getpeercert(True))  # type: ignore
-
-        certificate = x509.load_pem_x509_certificate(pem_data.encode(), default_backend())
-
-        if certificate.not_valid_after - certificate.not_valid_before != timedelta(days=int(action.ssl_expiration)):
-            LOGGER.error(f"Expiration date of SSL certificate is {certificate.not_valid_after} but should be {certificate.not_valid_before + timedelta(days=int(action.ssl_expiration))}, exiting ...")
-            exit(1)
-
-        if sorted(attribute.rfc4514_string() for attribute in certificate.subject) != sorted(v for v in action.ssl_subject.split("/") if v):
-            LOGGER.error(f"SSL subject {certificate.subject} is different from the one in the configuration, exiting ...")
-            exit(1)
-else:
-    firefox_options = Options()
-    firefox_options.add_argument("--headless")
+            LOGGER.error("Response URL scheme is not HTTPS")
+            return False
+        return check_ssl(action, response)
+    elif action.type == "cookie":
+        cookies = parse_set_cookies(response)
+        return check_cookie(action, cookies.get(action.cookie_name), list(cookies.values()))
+
+    return True
 
-    LOGGER.info("Starting Firefox ...")
-    with webdriver.Firefox(options=firefox_options) as driver:
-        driver.delete_all_cookies()
+
+def capture_tls(response: Response):
+    """Keep the TLS details of the connection that carried the response, while it's still open"""
+    network_stream = response.extensions.get("network_stream")
+    ssl_object = network_stream.get_extra_info("ssl_object") if network_stream is not None else None
+    if ssl_object is None:
+        return
+
+    # ? The whole chain is only exposed by recent Python versions, and as Certificate objects before 3.13
+    get_chain = getattr(ssl_object, "get_unverified_chain", None)
+    chain = [certificate if isinstance(certificate, bytes) else PEM_cert_to_DER_cert(certificate.public_bytes()) for certificate in get_chain() or []] if get_chain is not None else []
+
+    response.extensions["tls"] = {
+        "version": ssl_object.version(),
+        "cipher": ssl_object.cipher(),
+        "alpn": ssl_object.selected_alpn_protocol(),
+        "chain": chain or [ssl_object.getpeercert(True)],
+    }
+
+
+async def capture_tls_async(response: Response):
+    """Async version of capture_tls, for the async clients' event hooks"""
+    capture_tls(response)
+
+
+def get_certificate(der: bytes) -> x509.Certificate:
+    """Parse a DER certificate, caching it by its fingerprint"""
+    fingerprint = sha256(der).digest()
+    if fingerprint not in CERTIFICATES:
+        CERTIFICATES[fingerprint] = x509.load_der_x509_certificate(der, default_backend())
+    return CERTIFICATES[fingerprint]
+
+
+def probe_protocol(host: str, port: int, protocol: str) -> Optional[bool]:
+    """Try a handshake only allowing the given protocol, None means the protocol can't be offered on our side"""
+    version, supported = TLS_VERSIONS[protocol]
+    if not supported:
+        return None
+
+    ssl_context = create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = CERT_NONE
+    if protocol in ("TLSv1", "TLSv1.1"):
+        ssl_context.set_ciphers("DEFAULT:@SECLEVEL=0")  # ? Old protocols are disabled by the default security level
+    ssl_context.minimum_version = ssl_context.maximum_version = version
+
+    try:
+        with create_connection((host, port), timeout=10) as conn:
+            with ssl_context.wrap_socket(conn, server_hostname=host):
+                return True
+    except (OSError, ValueError):
+        return False
+
+
+def check_ssl(action: Action, response: Response) -> bool:
+    """Check the TLS details of the connection that carried the response"""
+    tls = response.extensions.get("tls")
+    if tls is None:
+        LOGGER.error("No TLS details found for the connection used by the request")
+        return False
+
+    LOGGER.debug(f"Response SSL version: {tls['version']}")
+    LOGGER.debug(f"Response SSL cipher: {tls['cipher']}")
+    LOGGER.debug(f"Response SSL ALPN protocol: {tls['alpn']}")
+    LOGGER.debug(f"Response SSL certificate chain: {[DER_cert_to_PEM_cert(der) for der in tls['chain']]}")
+
+    if tls["version"] not in action.ssl_protocols:
+        LOGGER.error(f"SSL version {tls['version']} not found in response")
+        return False
+
+    if action.ssl_probe:
+        host, port = response.url.host, response.url.port or 443
+        with ThreadPoolExecutor(len(TLS_VERSIONS)) as executor:
+            results = dict(zip(TLS_VERSIONS, executor.map(lambda protocol: probe_protocol(host, port, protocol), TLS_VERSIONS)))
+
+        LOGGER.debug(f"SSL protocols probe results: {results}")
+        for protocol, accepted in results.items():
+            if accepted is None:
+                LOGGER.warning(f"SSL version {protocol} can't be probed as it isn't supported locally")
+            elif accepted and protocol not in action.ssl_protocols:
+                LOGGER.error(f"SSL version {protocol} is accepted but it isn't in {action.ssl_protocols}")
+                return False
+            elif not accepted and protocol in action.ssl_protocols:
+                LOGGER.error(f"SSL version {protocol} is refused but it is in {action.ssl_protocols}")
+                return False
+        LOGGER.info(f"SSL versions {', '.join(sorted(action.ssl_protocols))} are the only ones accepted")
+
+    certificate = get_certificate(tls["chain"][0])
+
+    if certificate.not_valid_after - certificate.not_valid_before != timedelta(days=int(action.ssl_expiration)):
+        LOGGER.error(f"Expiration date of SSL certificate is {certificate.not_valid_after} but should be {certificate.not_valid_before + timedelta(days=int(action.ssl_expiration))}")
+        return False
+
+    if sorted(attribute.rfc4514_string() for attribute in certificate.subject) != sorted(v for v in action.ssl_subject.split("/") if v):
+        LOGGER.error(f"SSL subject {certificate.subject} is different from the one in the configuration")
+        return False
+
+    LOGGER.info(f"SSL version {tls['version']} and certificate matched in response")
+    return True
+
+
+def parse_set_cookies(response: Response) -> Dict[str, dict]:
+    """Parse the Set-Cookie headers of the whole redirect chain into selenium-like cookies, later ones overriding earlier ones"""
+    cookies = {}
+    for hop in response.history + [response]:
+        for set_cookie in hop.headers.get_list("set-cookie"):
+            name, _, value = set_cookie.split(";", 1)[0].strip().partition("=")
+            cookie = {"name": name, "value": value.strip('"'), "secure": False, "httpOnly": False, "sameSite": None}
+
+            for attribute in set_cookie.split(";")[1:]:
+                key, _, attribute_value = attribute.strip().partition("=")
+                key = key.lower()
+                if key == "secure":
+                    cookie["secure"] = True
+                elif key == "httponly":
+                    cookie["httpOnly"] = True
+                elif key == "samesite":
+                    cookie["sameSite"] = attribute_value.capitalize()
+                elif key == "max-age" and attribute_value.lstrip("-").isdigit() and int(attribute_value) <= 0:
+                    cookie = None  # ? The cookie is deleted
+                    break
+
+            if cookie is None:
+                cookies.pop(name, None)
+            else:
+                cookies[name] = cookie
+    return cookies
+
+
+def check_cookie(action: Action, cookie: Optional[dict], cookies: List[dict]) -> bool:
+    """Check the cookie of a cookie action, coming either from a browser or from the Set-Cookie headers"""
+    if cookie is not None:
+        if action.cookie_rx is None:
+            LOGGER.error(f"Cookie {action.cookie_name} found in page\ncookies: {cookies}")
+            return False
+        elif not match(action.cookie_rx, cookie["value"]):
+            LOGGER.error(f"Cookie {action.cookie_name} with regex {action.cookie_rx} not found in page\ncookies: {cookies}")
+            return False
+        elif cookie.get("secure", False) != action.cookie_secure_flag:
+            LOGGER.error(f"Cookie {action.cookie_name} doesn't have the right secure flag\ncookies: {cookies}")
+            return False
+        elif cookie.get("httpOnly", False) != action.cookie_http_only_flag:
+            LOGGER.error(f"Cookie {action.cookie_name} doesn't have the right HttpOnly flag\ncookies: {cookies}")
+            return False
+        elif cookie.get("sameSite", None) != action.cookie_same_site_flag:
+            LOGGER.error(f"Cookie {action.cookie_name} doesn't have the right SameSite flag\ncookies: {cookies}")
+            return False
+        LOGGER.info(f"Cookie {action.cookie_name} with regex {action.cookie_rx} matched in page, flags are correct")
+    elif action.cookie_rx is not None:
+        LOGGER.error(f"Cookie {action.cookie_name} with regex {action.cookie_rx} not found in page\ncookies: {cookies}")
+        return False
+    else:
+        LOGGER.info(f"Cookie {action.cookie_name} not found in page")
+    return True
+
+
+def needs_browser(action: Action) -> bool:
+    """Whether the action has to be checked in a browser"""
+    return action.type == "xpath" or (action.type == "cookie" and action.requires_js)
+
+
+@contextmanager
+def get_driver() -> Iterator[webdriver.Firefox]:
+    """Borrow a headless Firefox from the pool, starting a new one only if none is idle"""
+    try:
+        driver = DRIVERS.get_nowait()
+    except Empty:
+        firefox_options = Options()
+        firefox_options.add_argument("--headless")
+
+        LOGGER.info("Starting Firefox ...")
+        driver = webdriver.Firefox(options=firefox_options)
         driver.maximize_window()
+        STARTED_DRIVERS.append(driver)
+
+    try:
+        yield driver
+    finally:
+        # ? Reset the browser state before giving it back so the next action starts from a clean slate
+        try:
+            driver.delete_all_cookies()
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            driver.get("about:blank")
+            DRIVERS.put(driver)
+        except WebDriverException:
+            LOGGER.warning("Couldn't reset Firefox, it won't be reused")
+            STARTED_DRIVERS.remove(driver)
+            driver.quit()
+
+
+def check_browser(action: Action) -> bool:
+    """Check a Selenium based action with a pooled headless Firefox"""
+    with get_driver() as driver:
         driver_wait = WebDriverWait(driver, 10)
 
         LOGGER.info(f"Navigating to {action.url} ...")
@@ -195,30 +600,599 @@ else:
                 driver_wait.until(EC.presence_of_element_located((By.XPATH, action.xpath)))
             except TimeoutException:
                 LOGGER.exception(f"Xpath {action.xpath} not found in page")
-                exit(1)
+                return False
         elif action.type == "cookie":
-            cookie = driver.get_cookie(action.cookie_name)
-            if cookie is not None:
-                if action.cookie_rx is None:
-                    LOGGER.error(f"Cookie {action.cookie_name} found in page, exiting ...\ncookies: {driver.get_cookies()}")
-                    exit(1)
-                elif not match(action.cookie_rx, cookie["value"]):
-                    LOGGER.error(f"Cookie {action.cookie_name} with regex {action.cookie_rx} not found in page, exiting ...\ncookies: {driver.get_cookies()}")
-                    exit(1)
-                elif cookie.get("secure", False) != action.cookie_secure_flag:
-                    LOGGER.error(f"Cookie {action.cookie_name} doesn't have the right secure flag, exiting ...\ncookies: {driver.get_cookies()}")
-                    exit(1)
-                elif cookie.get("httpOnly", False) != action.cookie_http_only_flag:
-                    LOGGER.error(f"Cookie {action.cookie_name} doesn't have the right HttpOnly flag, exiting ...\ncookies: {driver.get_cookies()}")
-                    exit(1)
-                elif cookie.get("sameSite", None) != action.cookie_same_site_flag:
-                    LOGGER.error(f"Cookie {action.cookie_name} doesn't have the right SameSite flag, exiting ...\ncookies: {driver.get_cookies()}")
-                    exit(1)
-                LOGGER.info(f"Cookie {action.cookie_name} with regex {action.cookie_rx} matched in page, flags are correct")
-            elif action.cookie_rx is not None:
-                LOGGER.error(f"Cookie {action.cookie_name} with regex {action.cookie_rx} not found in page, exiting ...\ncookies: {driver.get_cookies()}")
-                exit(1)
-            else:
-                LOGGER.info(f"Cookie {action.cookie_name} not found in page")
+            return check_cookie(action, driver.get_cookie(action.cookie_name), driver.get_cookies())
+
+    return True
+
+
+def cleanup():
+    """Close the pooled HTTP clients, Redis clients, database engines and browsers"""
+    for client in CLIENTS.values():
+        client.close()
+
+    for redis_client in REDIS_CLIENTS.values():
+        redis_client.close()
+
+    for engine in ENGINES.values():
+        engine.dispose()
+
+    for driver in STARTED_DRIVERS:
+        driver.quit()
+
+
+async def check_load(action: Action) -> bool:
+    """Put the URL under load and check the latency, throughput and error rate thresholds"""
+    LOGGER.info(f"🏋️ Sending {action.method} requests to {action.url} over {action.connections} connection(s) {f'at {action.rate} req/s' if action.rate else 'as fast as possible'} for {action.duration} seconds ...")
+
+    result = await run_load(
+        action.url,
+        method=action.method,
+        headers=action.headers,
+        content=b"a" * action.body_length if action.body_length > 0 else None,
+        auth=action.auth,
+        follow_redirects=action.follow_redirects,
+        connections=action.connections,
+        rate=action.rate,
+        duration=action.duration,
+        http2=action.http2,
+        verify=action.verify_ssl,
+        is_error=lambda status: status != action.load_status,
+    )
+    histogram = result.histogram
+    latencies = {"p50": histogram.percentile(50) / 1000, "p90": histogram.percentile(90) / 1000, "p99": histogram.percentile(99) / 1000, "max": histogram.max / 1000}
+
+    LOGGER.info(f"📊 {result.requests} request(s) in {result.elapsed:.2f} seconds ({result.rps:.1f} req/s), {result.errors} error(s) ({result.error_rate:.2%}), status codes: {result.statuses}")
+    LOGGER.info(f"📊 Latency: mean {histogram.mean / 1000:.2f}ms, " + ", ".join(f"{name} {value:.2f}ms" for name, value in latencies.items()))
+
+    passed = True
+    for name, threshold in (("p50", action.max_p50), ("p99", action.max_p99), ("max", action.max_latency)):
+        if threshold is not None and latencies[name] > threshold:
+            LOGGER.error(f"Latency {name} is {latencies[name]:.2f}ms, above the {threshold}ms threshold")
+            passed = False
+
+    if action.min_rps is not None and result.rps < action.min_rps:
+        LOGGER.error(f"Throughput is {result.rps:.1f} req/s, below the {action.min_rps} req/s threshold")
+        passed = False
+
+    if result.error_rate > action.max_error_rate:
+        LOGGER.error(f"Error rate is {result.error_rate:.2%}, above the {action.max_error_rate:.2%} threshold")
+        passed = False
+
+    if passed:
+        LOGGER.info("Load thresholds are respected")
+    return passed
+
+
+async def check_rate(action: Action) -> bool:
+    """Send a precisely timed request train and check where requests start being limited and when they recover"""
+    # ? Without an upper bound, the recovery is waited for until the timeout of the action
+    recovery = action.recovery_max if action.recovery_max is not None else max(action.timeout, action.recovery_min) if action.recovery_min is not None else None
+    LOGGER.info(f"🚂 Sending {action.requests} {action.method} request(s) to {action.url} at {action.rate} req/s over up to {action.connections} connection(s) ...")
+
+    result = await run_train(
+        action.url,
+        method=action.method,
+        headers=action.headers,
+        auth=action.auth,
+        requests=action.requests,
+        rate=action.rate,
+        connections=action.connections,
+        http2=action.http2,
+        verify=action.verify_ssl,
+        is_limited=lambda status: status == action.limited_status,
+        recovery_timeout=recovery + 1 / action.rate if recovery is not None else None,
+    )
+
+    LOGGER.info(f"📊 Status codes in order: {' '.join(str(status) for status in result.statuses)}")
+    LOGGER.debug(f"Response offsets: {[round(offset, 3) for offset in result.offsets]}")
+
+    if None in result.statuses:
+        LOGGER.error(f"Request {result.statuses.index(None) + 1} failed")
+        return False
+
+    first_limited = next((index for index, status in enumerate(result.statuses) if status == action.limited_status), None)
+    if action.limited_after is None:
+        if first_limited is not None:
+            LOGGER.error(f"Request {first_limited + 1} was limited with status code {action.limited_status}, no request should be")
+            return False
+        LOGGER.info(f"No request was limited with status code {action.limited_status}")
+    elif first_limited is None:
+        LOGGER.error(f"No request was limited with status code {action.limited_status}, it should start after {action.limited_after} request(s)")
+        return False
+    elif abs(first_limited - action.limited_after) > action.limited_tolerance:
+        LOGGER.error(f"Requests started being limited after {first_limited} request(s) instead of {action.limited_after} (tolerance: {action.limited_tolerance})")
+        return False
+    else:
+        LOGGER.info(f"Requests started being limited after {first_limited} request(s)")
+
+    if recovery is not None:
+        if result.recovered_after is None:
+            LOGGER.error(f"Requests are still limited {recovery} seconds after the train")
+            return False
+        elif action.recovery_max is not None and result.recovered_after > action.recovery_max:
+            LOGGER.error(f"Requests recovered {result.recovered_after:.2f} seconds after the train, later than {action.recovery_max} seconds")
+            return False
+        elif action.recovery_min is not None and result.recovered_after < action.recovery_min:
+            LOGGER.error(f"Requests recovered {result.recovered_after:.2f} seconds after the train, earlier than {action.recovery_min} seconds")
+            return False
+        LOGGER.info(f"Requests recovered {result.recovered_after:.2f} seconds after the train")
+
+    return True
+
+
+def send_trigger(action: Action):
+    """Send the request of an action checking the state of the stack rather than the response, if it has one"""
+    if action.url:
+        response = send_request(action)
+        LOGGER.info(f"Request sent, status code: {response.status_code if isinstance(response, Response) else 'failed'}")
+
+
+def check_log(action: Action) -> bool:
+    """Wait until enough new lines of the log match the pattern, reading only what was written since the previous check of the log"""
+    send_trigger(action)
+
+    tail = LOG_TAILS.get(action.log)
+    pattern = re_compile(action.log_rx)
+    with tail.lock:
+        tail.rewind()
+        bytes_read = tail.bytes_read
+        deadline = monotonic() + (action.timeout if action.log_count else 0)
+        LOGGER.info(f"📜 Looking for {action.log_rx} in the {action.log} log {f'({action.log_count} line(s) expected)' if action.log_count else '(no line expected)'} ...")
+
+        found = 0
+        while True:
+            for line, offset in tail.read():
+                if not pattern.search(line):
+                    continue
+                found += 1
+                LOGGER.debug(f"Matching line: {line}")
+                if not action.log_count:
+                    LOGGER.error(f"Forbidden line found in the {action.log} log: {line}")
+                    return False
+                elif found >= action.log_count:
+                    # ? The lines following the match are left for the next checks of the log
+                    tail.commit(offset)
+                    LOG_TAILS.save(tail)
+                    LOGGER.info(f"{found} matching line(s) found in the {action.log} log ({tail.bytes_read - bytes_read} new byte(s) read)")
+                    return True
+
+            if monotonic() + LOG_POLL_INTERVAL > deadline:
+                break
+            sleep(LOG_POLL_INTERVAL)
+
+        tail.commit(tail.cursor)
+        LOG_TAILS.save(tail)
+
+    if not action.log_count:
+        LOGGER.info(f"No matching line found in the {action.log} log ({tail.bytes_read - bytes_read} new byte(s) read)")
+        return True
+    LOGGER.error(f"Only {found} / {action.log_count} matching line(s) found in the {action.log} log within {action.timeout} seconds")
+    return False
+
+
+def get_stack_settings() -> Dict[str, str]:
+    """Return the core section of the config the stack was generated with, empty if it can't be read"""
+    try:
+        return load_yaml(SLOT.config_path).get("core", {})
+    except (OSError, AttributeError):
+        return {}
+
+
+def get_redis(action: Action) -> Redis:
+    """Return the pooled Redis client of the action's server"""
+    url = action.redis_url or getenv("REDIS_URL")
+    if not url:
+        settings = get_stack_settings()
+        url = f"redis://{settings.get('redis_host', '127.0.0.1')}:{settings.get('redis_port', 6379)}/{settings.get('redis_database', 0)}"
+
+    if url not in REDIS_CLIENTS:
+        LOGGER.debug(f"Creating a new Redis client for {url}")
+        REDIS_CLIENTS[url] = Redis.from_url(url, socket_timeout=10, decode_responses=True)
+    return REDIS_CLIENTS[url]
+
+
+def check_redis(action: Action) -> bool:
+    """Check the keys of the cache, their TTL and the keyspace hits and misses of the server"""
+    send_trigger(action)
+
+    client = get_redis(action)
+    LOGGER.info(f"🗃 Checking the keys matching {action.redis_pattern} in Redis ...")
+
+    # ? SCAN doesn't block the server like KEYS would, and the TTLs are asked in a single round trip
+    keys = []
+    count = 0
+    for key in client.scan_iter(match=action.redis_pattern, count=1000):
+        count += 1
+        if len(keys) < MAX_TTL_CHECKS:
+            keys.append(key)
+
+    passed = True
+    LOGGER.info(f"📊 {count} key(s) matching {action.redis_pattern}")
+    if action.min_keys is not None and count < action.min_keys:
+        LOGGER.error(f"Only {count} key(s) match {action.redis_pattern}, at least {action.min_keys} expected")
+        passed = False
+    if action.max_keys is not None and count > action.max_keys:
+        LOGGER.error(f"{count} key(s) match {action.redis_pattern}, at most {action.max_keys} expected")
+        passed = False
+
+    if (action.min_ttl is not None or action.max_ttl is not None) and keys:
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.pttl(key)
+        # ? -2 means that the key expired in the meantime, -1 that it has no TTL
+        ttls = {key: ttl / 1000 if ttl >= 0 else None for key, ttl in zip(keys, pipeline.execute()) if ttl != -2}
+        LOGGER.debug(f"TTLs: {ttls}")
+        for key, ttl in ttls.items():
+            if action.min_ttl is not None and ttl is not None and ttl < action.min_ttl:
+                LOGGER.error(f"Key {key} expires in {ttl:.1f} seconds, before {action.min_ttl} seconds")
+                passed = False
+            elif action.max_ttl is not None and (ttl is None or ttl > action.max_ttl):
+                LOGGER.error(f"Key {key} {'never expires' if ttl is None else f'expires in {ttl:.1f} seconds'}, it should within {action.max_ttl} seconds")
+                passed = False
+        if passed:
+            LOGGER.info(f"TTLs of {len(ttls)} key(s) are respected")
+
+    stats = client.info("stats")
+    hits, misses = stats.get("keyspace_hits", 0), stats.get("keyspace_misses", 0)
+    ratio = hits / (hits + misses) if hits + misses else 0.0
+    LOGGER.info(f"📊 Keyspace hits: {hits}, misses: {misses} (hit ratio: {ratio:.2%})")
+    if action.min_hits is not None and hits < action.min_hits:
+        LOGGER.error(f"Only {hits} keyspace hit(s), at least {action.min_hits} expected")
+        passed = False
+    if action.min_hit_ratio is not None and ratio < action.min_hit_ratio:
+        LOGGER.error(f"Hit ratio is {ratio:.2%}, below the {action.min_hit_ratio:.2%} threshold")
+        passed = False
+
+    if action.redis_reset_stats:
+        client.config_resetstat()
+        LOGGER.info("Redis stats reset")
+
+    return passed
+
+
+def get_engine(action: Action) -> Engine:
+    """Return the pooled engine of the action's database"""
+    uri = action.database_uri or getenv("DATABASE_URI") or get_stack_settings().get("database_uri", "sqlite:////var/lib/bunkerweb/db.sqlite")
+
+    if uri not in ENGINES:
+        LOGGER.debug(f"Creating a new database engine for {uri}")
+        ENGINES[uri] = create_engine(uri, pool_pre_ping=True)
+    return ENGINES[uri]
+
+
+def check_db(action: Action) -> bool:
+    """Run the query against the database and check its rows and its latency"""
+    send_trigger(action)
+
+    LOGGER.info(f"🗄 Running {action.query} {f'{action.query_runs} times ' if action.query_runs > 1 else ''}...")
+
+    latencies = []
+    with get_engine(action).connect() as connection:
+        for _ in range(action.query_runs):
+            start = monotonic()
+            rows = connection.execute(text(action.query)).fetchall()
+            latencies.append((monotonic() - start) * 1000)
+
+    passed = True
+    latency = median(latencies)
+    LOGGER.info(f"📊 {len(rows)} row(s), latency: median {latency:.2f}ms, max {max(latencies):.2f}ms")
+    LOGGER.debug(f"Rows: {rows}")
+
+    if action.min_rows is not None and len(rows) < action.min_rows:
+        LOGGER.error(f"Only {len(rows)} row(s) returned, at least {action.min_rows} expected")
+        passed = False
+    if action.max_rows is not None and len(rows) > action.max_rows:
+        LOGGER.error(f"{len(rows)} row(s) returned, at most {action.max_rows} expected")
+        passed = False
+
+    if action.row_rx is not None:
+        pattern = re_compile(action.row_rx)
+        if not any(pattern.search(" | ".join(str(column) for column in row)) for row in rows):
+            LOGGER.error(f"No row matches {action.row_rx}")
+            passed = False
+        else:
+            LOGGER.info(f"A row matches {action.row_rx}")
+
+    if action.max_query_latency is not None and latency > action.max_query_latency:
+        LOGGER.error(f"Query latency is {latency:.2f}ms, above the {action.max_query_latency}ms threshold")
+        passed = False
+
+    return passed
+
+
+def run_check(action: Action) -> bool:
+    """Run the check of an action once and return whether it passed"""
+    try:
+        if action.type == "load":
+            return run_async(check_load(action))
+        elif action.type == "rate":
+            return run_async(check_rate(action))
+        elif action.type == "log":
+            return check_log(action)
+        elif action.type == "redis":
+            return check_redis(action)
+        elif action.type == "db":
+            return check_db(action)
+        elif not needs_browser(action):
+            matcher = get_matcher(action)
+            return check_response(action, send_request(action, matcher), matcher)
+        return check_browser(action)
+    except Exception:
+        LOGGER.exception(f"{action.type.title()} test raised an exception")
+        return False
+
+
+def run_attempt(action: Action) -> Tuple[bool, List[LogRecord]]:
+    """Run the check of an action once, holding back its logs so that only the relevant attempts are shown"""
+    token = HELD_RECORDS.set([])
+    try:
+        return run_check(action), HELD_RECORDS.get()
+    finally:
+        HELD_RECORDS.reset(token)
+
+
+class Convergence:
+    """Keep track of the attempts of a converging action"""
+
+    def __init__(self, action: Action):
+        self.action = action
+        self.start = monotonic()
+        self.backoff = CONVERGE_BACKOFF
+        self.attempts = 0
+        self.successes = 0
+        self.passed = False
+
+        LOGGER.info(f"🎯 Converging {action.type} test (timeout: {action.timeout}s, consecutive successes needed: {action.converge_successes}) ...")
+
+    def next_wait(self, passed: bool, records: List[LogRecord]) -> Optional[float]:
+        """Record an attempt and return how long to wait before the next one, or None once the action is done"""
+        self.attempts += 1
+        self.successes = self.successes + 1 if passed else 0
+
+        if self.successes >= self.action.converge_successes:
+            for record in records:
+                LOGGER.handle(record)
+            LOGGER.info(f"🎯 Converged in {monotonic() - self.start:.2f} seconds after {self.attempts} attempt(s)")
+            self.passed = True
+            return None
+
+        # ? Consecutive successes are confirmed quickly, failures back off exponentially, the last attempt is made right at the deadline
+        remaining = self.start + self.action.timeout - monotonic()
+        if remaining <= 0:
+            for record in records:
+                LOGGER.handle(record)
+            LOGGER.error(f"Didn't converge within {self.action.timeout} seconds after {self.attempts} attempt(s)")
+            return None
+        wait = min(CONVERGE_BACKOFF if passed else self.backoff, remaining)
+
+        if passed:
+            LOGGER.info(f"⏳ Attempt {self.attempts} passed ({self.successes}/{self.action.converge_successes}), checking again in {wait:.1f} seconds ...")
+        else:
+            LOGGER.info(f"⏳ Attempt {self.attempts} failed, retrying in {wait:.1f} seconds ...")
+            self.backoff = min(self.backoff * 2, CONVERGE_MAX_BACKOFF)
+        return wait
+
+
+def converge(action: Action) -> bool:
+    """Retry the check of an action with an exponential backoff until it passes enough times in a row or the timeout is reached"""
+    convergence = Convergence(action)
+    while (wait := convergence.next_wait(*run_attempt(action))) is not None:
+        sleep(wait)
+    return convergence.passed
+
+
+def run_action(action: Action) -> bool:
+    """Run a single action and return whether it passed"""
+    if action.converge or ARGS.converge:
+        return converge(action)
+
+    if action.delay > 0:
+        LOGGER.info(f"⏲ Waiting {action.delay} seconds ...")
+        sleep(action.delay)
+
+    LOGGER.info(f"📡 Starting {action.type} test ...")
+
+    return run_check(action)
+
+
+def get_async_client(action: Action) -> AsyncClient:
+    """Return an async client with its own cookies, sharing the pooled transport matching the action's settings"""
+    key = (action.http2, action.verify_ssl)
+
+    if key not in TRANSPORTS:
+        LOGGER.debug(f"Creating a new HTTP transport for {key}")
+        TRANSPORTS[key] = AsyncHTTPTransport(verify=action.verify_ssl, http1=not action.http2, http2=action.http2)
+
+    # ? The client is never closed as it would close the shared transport too
+    return AsyncClient(transport=TRANSPORTS[key], auth=action.auth, timeout=10, follow_redirects=action.follow_redirects, event_hooks={"response": [capture_tls_async]})
+
+
+async def send_request_async(action: Action, matcher: Optional[BodyMatcher] = None) -> Union[Response, str]:
+    """Async version of send_request, uploads are sent by send_request from a thread.
+
+    asyncio aborts the transport as soon as a write fails, dropping the response of a server that rejected the body and closed the
+    connection without reading it (e.g. a 413), where the blocking socket of the sync engine can still read it."""
+    if action.body_length > 0:
+        return await to_thread(send_request, action, matcher)
+
+    log_request(action)
+
+    client = get_async_client(action)
+    tracer = RequestTracer()
+    request, body = build_request(client, action, tracer)
+
+    response: Union[Response, str]
+    try:
+        response = await client.send(request, stream=matcher is not None)
+        if matcher is not None:
+            try:
+                async for chunk in response.aiter_text(CHUNK_SIZE):
+                    matcher.feed(chunk)
+                    if matcher.done:
+                        break
+            finally:
+                await response.aclose()
+    except Exception:
+        response = format_exc()
+
+    log_upload(body, response)
+    save_timings(tracer, request, response, body)
+    return response
+
+
+async def run_check_async(action: Action) -> bool:
+    """Run the check of an action once without blocking the event loop"""
+    try:
+        if action.type == "load":
+            return await check_load(action)
+        elif action.type == "rate":
+            return await check_rate(action)
+        elif action.type == "log":
+            return await to_thread(check_log, action)
+        elif action.type == "redis":
+            return await to_thread(check_redis, action)
+        elif action.type == "db":
+            return await to_thread(check_db, action)
+        elif not needs_browser(action):
+            matcher = get_matcher(action)
+            response = await send_request_async(action, matcher)
+            return await to_thread(check_response, action, response, matcher)
+        return await to_thread(check_browser, action)
+    except Exception:
+        LOGGER.exception(f"{action.type.title()} test raised an exception")
+        return False
+
+
+async def run_attempt_async(action: Action) -> Tuple[bool, List[LogRecord]]:
+    """Async version of run_attempt, the held back logs are isolated per task"""
+    token = HELD_RECORDS.set([])
+    try:
+        return await run_check_async(action), HELD_RECORDS.get()
+    finally:
+        HELD_RECORDS.reset(token)
+
+
+async def run_action_async(action: Action) -> bool:
+    """Async version of run_action"""
+    if action.converge or ARGS.converge:
+        convergence = Convergence(action)
+        while (wait := convergence.next_wait(*await run_attempt_async(action))) is not None:
+            await async_sleep(wait)
+        return convergence.passed
+
+    if action.delay > 0:
+        LOGGER.info(f"⏲ Waiting {action.delay} seconds ...")
+        await async_sleep(action.delay)
+
+    LOGGER.info(f"📡 Starting {action.type} test ...")
+
+    return await run_check_async(action)
+
+
+async def run_actions_async(filename: str, actions: Dict[str, Action], parallel: int) -> List[dict]:
+    """Run the actions concurrently, respecting their barriers, and return their results in declaration order"""
+    semaphore = Semaphore(parallel)
+    tasks: Dict[str, Task] = {}
+    barrier: Optional[str] = None
+
+    async def run(action_str: str, action: Action, dependencies: List[Task]) -> dict:
+        if dependencies:
+            await wait(dependencies)
+
+        async with semaphore:
+            LOGGER.info(f"🚀 Running {filename} / {action_str} test")
+
+            CURRENT_ACTION.set((filename, action_str))
+            start = monotonic()
+            passed = await run_action_async(action)
+
+        if passed:
+            LOGGER.info(f"✅ Test {filename} / {action_str} passed")
+        else:
+            LOGGER.error(f"Test {filename} / {action_str} failed")
+
+        return {"action": action_str, "passed": passed, "duration": round(monotonic() - start, 3)}
+
+    for action_str, action in actions.items():
+        # ? Actions with a delay wait for the stack to change and load/rate actions need the stack for themselves, so they are barriers too
+        if action.barrier or action.delay > 0 or action.type in ("load", "rate"):
+            dependencies = list(tasks.values())
+            barrier = action_str
+        else:
+            dependencies = ([tasks[barrier]] if barrier else []) + [tasks[after] for after in action.after if after in tasks]
+        tasks[action_str] = create_task(run(action_str, action, dependencies))
+
+    try:
+        return list(await gather(*tasks.values()))
+    finally:
+        for transport in TRANSPORTS.values():
+            await transport.aclose()
+
+
+test_split = ARGS.test.split(";")
+filename = test_split[0]
+
+if not ARGS.batch:
+    action_str = test_split[1]
+
+    LOGGER.info(f"🚀 Running {filename} / {action_str} test")
+
+    CURRENT_ACTION.set((filename, action_str))
+    passed = run_action(load_actions(filename, [action_str])[action_str])
+
+    cleanup()
+
+    if not passed:
+        exit(1)
+
+    LOGGER.info("✅ Test passed")
+    exit(0)
+
+LOGGER.info(f"🚀 Running {filename} tests in batch mode{f' with up to {ARGS.parallel} concurrent actions' if ARGS.parallel > 1 else ''}")
+
+action_groups = [group.split(",") for group in ARGS.actions.split(";")] if ARGS.actions else [None]
+actions = load_actions(filename, [action_str for group in action_groups for action_str in group] if ARGS.actions else None)
+
+# ? Groups packed on the same stack are each served by their own virtual host, the actions target the first one
+for server, group in zip(PACKING_SERVERS[1:], action_groups[1:]):
+    for action_str in group:
+        actions[action_str] = actions[action_str].model_copy(update={"url": actions[action_str].url.replace(f"://{PACKING_SERVERS[0]}", f"://{server}", 1)})
+        LOGGER.debug(f"Action {action_str} packed on {server}: {actions[action_str].url}")
+
+LOGGER.info(f"✅ {len(actions)} action(s) validated: {', '.join(actions)}")
+
+report = {"file": filename, "actions": []}
+if ARGS.parallel > 1:
+    report["actions"] = run_async(run_actions_async(filename, actions, ARGS.parallel))
+else:
+    for action_str, action in actions.items():
+        LOGGER.info(f"🚀 Running {filename} / {action_str} test")
+
+        CURRENT_ACTION.set((filename, action_str))
+        start = monotonic()
+        passed = run_action(action)
+        report["actions"].append({"action": action_str, "passed": passed, "duration": round(monotonic() - start, 3)})
+
+        if passed:
+            LOGGER.info(f"✅ Test {filename} / {action_str} passed")
+        else:
+            LOGGER.error(f"Test {filename} / {action_str} failed")
+
+cleanup()
+
+report["passed"] = all(result["passed"] for result in report["actions"])
+
+for result in report["actions"]:
+    LOGGER.info(f"{'✅' if result['passed'] else '❌'} {filename} / {result['action']} ({result['duration']}s)")
+
+LOGGER.info(f"📝 Writing report to {ARGS.report}")
+Path(ARGS.report).parent.mkdir(parents=True, exist_ok=True)
+Path(ARGS.report).write_text(dumps(report, indent=2))
+
+if not report["passed"]:
+    LOGGER.error(f"{sum(not result['passed'] for result in report['actions'])} / {len(report['actions'])} test(s) failed")
+    exit(1)
 
-LOGGER.info("✅ Test passed")
+LOGGER.info("✅ All tests passed")
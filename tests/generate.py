@@ -2,15 +2,22 @@
 # -*- coding: utf-8 -*-
 
 from argparse import ArgumentParser
+from json import dumps, loads
 from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
 from os import getenv, sep
 from os.path import join
 from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
+from cache import load_yaml
+from compiled import get_planned_actions, load_plan
 from models import Action, SeleniumAction
+from reload import hot_reload
+from slot import get_slot
+from stack import get_autoconf_services, get_base_config, get_config_diff, get_config_hash, get_effective_config, get_effective_labels, get_packed_config, needs_restart
 
 from pydantic import ValidationError
-from yaml import safe_dump, safe_load
+from yaml import safe_dump
 
 basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
 
@@ -25,117 +32,173 @@ LOGGER = getLogger("GENERATE")
 parser = ArgumentParser(prog="Tests generator", description="Generate all the files needed to run a test.")
 parser.add_argument("integration", type=str, help="Integration to test", choices=["Docker", "Linux", "Autoconf"])  # TODO: Add Swarm and Kubernetes
 parser.add_argument("type", type=str, help="Type of test to parse", choices=["examples", "core", "ui"])
-parser.add_argument("test", type=str, help="Test to generate the files for")
+parser.add_argument("test", type=str, help='Test to generate the files for ("file;action" or "file;action1,action2" for actions sharing the same config)')
 parser.add_argument("--dev", action="store_true", help="Run in development mode")
+parser.add_argument(
+    "--reload",
+    action="store_true",
+    help="Apply the config to the running stack through the core API when only reloadable settings changed since the previous generation",
+)
 ARGS = parser.parse_args()
 
-integrations = safe_load(Path("tests", "integrations.yml").read_text())["dev" if ARGS.dev else "staging"]
+integrations = load_yaml(Path("tests", "integrations.yml"))["dev" if ARGS.dev else "staging"]
 
 test_split = ARGS.test.split(";")
 filename = test_split[0]
-action_str = test_split[1]
+action_groups = [group.split(",") for group in test_split[1:]]
 
-LOGGER.info(f"🛠 Running {filename} / {action_str} generation for integration {ARGS.integration}")
+LOGGER.info(f"🛠 Running {filename} / {' ; '.join(', '.join(action_strs) for action_strs in action_groups)} generation for integration {ARGS.integration}")
 
 if ARGS.integration not in integrations:
     LOGGER.error(f"Integration {ARGS.integration} not found in integrations.yml")
     exit(1)
 
+slot = get_slot()
+if slot.index and ARGS.integration != "Docker":
+    LOGGER.error(f"Only the Docker integration can run in slot {slot.index}, the other ones use host wide resources")
+    exit(1)
+
 file_path = join("tests", ARGS.type, f"{filename}.yml")
+compiled_plan = load_plan(ARGS.type, filename)
+stacks = compiled_plan["stacks"].get(ARGS.integration, {}) if compiled_plan is not None else {}
 
-LOGGER.info(f"📖 Reading {file_path}")
+data = None
 
-LOGGER.debug(f"Trying to open {file_path}")
 
-data = safe_load(Path(file_path).read_text())
+def get_group_stack(action_strs: List[str]) -> Tuple[List[Action], Dict[str, Any], Dict[str, str]]:
+    """Return the actions of a group and the config and labels of the stack they share"""
+    global data
 
-LOGGER.info("📖 Parsing test file")
-LOGGER.debug(f"Data: {data}")
+    if all(action_str in stacks for action_str in action_strs):
+        LOGGER.info(f"🧩 Using the compiled plan of {file_path}")
 
-action_data = data.get("actions", {}).get(action_str, {})
+        actions = list(get_planned_actions(compiled_plan, action_strs).values())
+        config = stacks[action_strs[0]]["config"]
+        labels = stacks[action_strs[0]]["labels"]
 
-LOGGER.debug(f"Action data: {action_data}")
+        # ? Actions generated together share the same stack, so they must share the same config
+        for action_str in action_strs[1:]:
+            if stacks[action_str]["hash"] != stacks[action_strs[0]]["hash"]:
+                LOGGER.error(f"Action {action_str} doesn't share the same config as {action_strs[0]}, they can't be generated together")
+                exit(1)
 
-if not action_data:
-    LOGGER.error(f"Action {action_str} not found in {filename}.yml")
-    exit(1)
+        return actions, config, labels
 
-action_type = action_data.get("type", "Type not found")
+    if data is None:
+        LOGGER.info(f"📖 Reading {file_path}")
 
-if action_type not in Action.model_fields["type"].annotation.__dict__["__args__"] and action_type not in SeleniumAction.model_fields["type"].annotation.__dict__["__args__"]:
-    LOGGER.error(f'Action {action_str} has an invalid type "{action_type}"')
-    exit(1)
+        LOGGER.debug(f"Trying to open {file_path}")
 
-try:
-    class_ = getattr(__import__("models"), action_type.title())
-    action = class_(**action_data)
-except ValidationError:
-    LOGGER.exception(f"Action {action_str} has invalid data")
-    exit(1)
+        data = load_yaml(file_path)
+
+        LOGGER.info("📖 Parsing test file")
+        LOGGER.debug(f"Data: {data}")
+
+    actions = []
+    for action_str in action_strs:
+        action_data = data.get("actions", {}).get(action_str, {})
+
+        LOGGER.debug(f"Action data: {action_data}")
+
+        if not action_data:
+            LOGGER.error(f"Action {action_str} not found in {filename}.yml")
+            exit(1)
+
+        action_type = action_data.get("type", "Type not found")
+
+        if action_type not in Action.model_fields["type"].annotation.__dict__["__args__"] and action_type not in SeleniumAction.model_fields["type"].annotation.__dict__["__args__"]:
+            LOGGER.error(f'Action {action_str} has an invalid type "{action_type}"')
+            exit(1)
 
-test_config = data.get("config", {})
-test_config = test_config | data.get(ARGS.integration, {}).get("config", {})
-config = safe_load(Path("tests", "config.yml").read_text())
+        try:
+            class_ = getattr(__import__("models"), action_type.title())
+            actions.append(class_(**action_data))
+        except ValidationError:
+            LOGGER.exception(f"Action {action_str} has invalid data")
+            exit(1)
 
-LOGGER.debug(f"Test config: {test_config}")
-LOGGER.debug(f"Default config: {config}")
+    action = actions[0]
+    base_config = get_base_config(ARGS.integration)
 
-if ARGS.integration != "Linux":
-    config["core"]["listen_addr"] = "0.0.0.0"
-    config["core"]["whitelist"] = "10.20.30.0/24"
-    config["core"]["bunkerweb_instances"] = ["10.20.30.254"]
+    LOGGER.debug(f"Default config: {base_config}")
+
+    config = get_effective_config(data, action, ARGS.integration, base_config)
+    labels = get_effective_labels(data, action, ARGS.integration)
+
+    # ? Actions generated together share the same stack, so they must share the same config
+    config_hash = get_config_hash(config, labels)
+    for action_str, other_action in zip(action_strs[1:], actions[1:]):
+        if get_config_hash(get_effective_config(data, other_action, ARGS.integration, base_config), get_effective_labels(data, other_action, ARGS.integration)) != config_hash:
+            LOGGER.error(f"Action {action_str} doesn't share the same config as {action_strs[0]}, they can't be generated together")
+            exit(1)
+
+    return actions, config, labels
+
+
+actions, config, labels = get_group_stack(action_groups[0])
+
+if len(action_groups) > 1:
+    if ARGS.integration == "Autoconf":
+        LOGGER.error("Autoconf stacks are configured with labels, their groups can't be packed")
+        exit(1)
+
+    # ? Groups packed on the same stack each get their own virtual host, core.py points their actions to it
+    configs = [config]
+    for action_strs in action_groups[1:]:
+        group_actions, group_config, _ = get_group_stack(action_strs)
+        actions.extend(group_actions)
+        configs.append(group_config)
+
+    config = get_packed_config(configs)
+    if config is None:
+        LOGGER.error(f"The configs of the {len(action_groups)} groups can't be packed on the same stack")
+        exit(1)
+
+    LOGGER.info(f"📦 {len(action_groups)} groups packed on {config['core']['server_name']}")
 
 if ARGS.integration == "Autoconf":
-    config["core"]["autoconf_mode"] = True
-    config["core"]["server_name"] = ""
-    config["core"]["multisite"] = True
-
-    test_labels = data.get("labels", {})
-    test_labels = test_labels | data.get(ARGS.integration, {}).get("labels", {})
-    AUTOCONF_PATH = Path("tests", "misc", "autoconf-services.yml")
-    autoconf = (
-        safe_load(AUTOCONF_PATH.read_text())
-        if AUTOCONF_PATH.is_file()
-        else {
-            "version": "3.5",
-            "services": {
-                "app1": {
-                    "image": "nginxdemos/nginx-hello:0.2",
-                    "networks": {
-                        "bw-services": {
-                            "ipv4_address": "192.168.0.254",
-                            "aliases": ["app1"],
-                        }
-                    },
-                }
-            },
-            "networks": {
-                "bw-services": {
-                    "external": True,
-                },
-            },
-        }
-    )
-
-    LOGGER.debug(f"Test labels: {test_labels}")
-    LOGGER.debug(f"Default labels: {autoconf}")
-
-    if "labels" not in autoconf["services"]["app1"]:
-        autoconf["services"]["app1"]["labels"] = {}
-
-    for key, value in (test_labels | action.labels | getattr(action, ARGS.integration).labels).items():
-        autoconf["services"]["app1"]["labels"][f"bunkerweb.{key.replace('bunkerweb.', '', 1).upper()}"] = value
+    autoconf = get_autoconf_services(labels)
 
     LOGGER.debug(f"Final labels: {autoconf}")
 
     LOGGER.info("📝 Writing /tmp/autoconf-services.yml")
     Path(sep, "tmp", "autoconf-services.yml").write_text(safe_dump(autoconf, indent=2))
 
-for key, value in (test_config | action.config | getattr(action, ARGS.integration).config).items():
-    config["core"][key.lower()] = value
+if slot.index:
+    # ? The addresses of the config and of the compose file are moved to the networks of the slot
+    config = slot.rewrite(config)
+    slot.tmp_path.mkdir(parents=True, exist_ok=True)
 
-LOGGER.debug(f"Final config: {config}")
-LOGGER.info("📝 Writing /etc/bunkerweb/config.yml")
+    LOGGER.info(f"📝 Writing {slot.tmp_path.joinpath('docker-compose.yml')} for slot {slot.index}")
+    slot.tmp_path.joinpath("docker-compose.yml").write_text(safe_dump(slot.get_compose(Path("tests", "docker-compose.yml")), indent=2))
 
-Path(sep, "etc", "bunkerweb", "config.yml").write_text(safe_dump(config, indent=2))
-Path(sep, "tmp", "timeout.txt").write_text(str(action.timeout))
+LOGGER.debug(f"Final config: {config}")
+LOGGER.info(f"📝 Writing {slot.config_path}")
+
+slot.config_path.write_text(safe_dump(config, indent=2))
+slot.timeout_path.write_text(str(max(action.timeout for action in actions)))
+
+# ? Config of the stack generated last, diffed with the next one to know whether it can be reloaded instead of restarted
+stack_path = slot.tmp_path.joinpath("stack.json")
+previous = loads(stack_path.read_text()) if ARGS.reload and stack_path.is_file() else {}
+
+reloaded = False
+if ARGS.reload and ARGS.integration == "Autoconf":
+    LOGGER.info("🔄 Autoconf stacks are configured with labels, restarting the stack")
+elif ARGS.reload and previous.get("integration") != ARGS.integration:
+    LOGGER.info("🔄 No previous stack to reload, restarting the stack")
+elif ARGS.reload:
+    diff = get_config_diff(previous["config"], config)
+    if not diff:
+        LOGGER.info("♻ The config didn't change, reusing the running stack")
+        reloaded = True
+    elif needs_restart(diff):
+        LOGGER.info(f"🔄 Restarting the stack, some of the changed settings can't be reloaded: {', '.join(key for _, key in diff)}")
+    else:
+        reloaded = hot_reload(config, diff)
+        if not reloaded:
+            LOGGER.warning("Hot reload failed, restarting the stack")
+
+stack_path.parent.mkdir(parents=True, exist_ok=True)
+stack_path.write_text(dumps({"integration": ARGS.integration, "config": config}, default=str))
+stack_path.with_name("reload.txt").write_text("reloaded" if reloaded else "restart")
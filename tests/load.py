@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from asyncio import create_task, gather, get_running_loop, sleep
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+
+from httpx import AsyncClient, Limits, Timeout
+
+# ? Each power of two is split in 2^SUB_BUCKET_BITS linear buckets, so recorded values are at most ~1.6% off
+SUB_BUCKET_BITS = 6
+
+
+class Histogram:
+    """HDR-style log-linear latency histogram, recording microseconds with a bounded relative error and a constant memory footprint"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        shift = max(value.bit_length() - SUB_BUCKET_BITS - 1, 0)
+        return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+    @staticmethod
+    def _value(index: int) -> int:
+        """Highest value that is recorded in the bucket, so percentiles are never underestimated"""
+        shift = max((index >> SUB_BUCKET_BITS) - 1, 0)
+        base = index - (shift << SUB_BUCKET_BITS)
+        return ((base + 1) << shift) - 1
+
+    def record(self, value: float):
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> int:
+        if not self.count:
+            return 0
+
+        target = max(percentile / 100 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+@dataclass
+class LoadResult:
+    histogram: Histogram = field(default_factory=Histogram)
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+async def run_load(
+    url: str,
+    *,
+    method: str = "GET",
+    headers: Optional[Dict[str, str]] = None,
+    content: Optional[bytes] = None,
+    auth: Optional[Tuple[str, str]] = None,
+    follow_redirects: bool = False,
+    connections: int = 10,
+    rate: Optional[float] = None,
+    duration: float = 10.0,
+    http2: bool = False,
+    verify: bool = True,
+    is_error: Callable[[int], bool] = lambda status: status >= 400,
+) -> LoadResult:
+    """Drive requests over the given number of concurrent connections, at the given rate (or as fast as possible) for the given duration.
+
+    When a rate is set, latencies are measured from the time each request was scheduled to be sent, so that a stalled server
+    can't hide its queueing delay by slowing down the load generator (coordinated omission)."""
+    result = LoadResult()
+    loop = get_running_loop()
+    counter = count()
+
+    async with AsyncClient(
+        http1=not http2,
+        http2=http2,
+        verify=verify,
+        headers=headers,
+        auth=auth,
+        follow_redirects=follow_redirects,
+        timeout=Timeout(10),
+        limits=Limits(max_connections=connections, max_keepalive_connections=connections),
+    ) as client:
+        start = loop.time()
+        end = start + duration
+
+        async def worker():
+            while True:
+                if rate:
+                    scheduled = start + next(counter) / rate
+                    if scheduled >= end:
+                        return
+                    if scheduled > loop.time():
+                        await sleep(scheduled - loop.time())
+                else:
+                    scheduled = loop.time()
+                    if scheduled >= end:
+                        return
+
+                try:
+                    response = await client.request(method, url, content=content)
+                    result.statuses[response.status_code] = result.statuses.get(response.status_code, 0) + 1
+                    failed = is_error(response.status_code)
+                except Exception:
+                    failed = True
+
+                result.histogram.record((loop.time() - scheduled) * 1_000_000)
+                result.requests += 1
+                result.errors += failed
+
+        await gather(*(create_task(worker()) for _ in range(connections)))
+        result.elapsed = loop.time() - start
+
+    return result
+
+
+@dataclass
+class TrainResult:
+    statuses: List[Optional[int]] = field(default_factory=list)  # ? None when the request failed
+    offsets: List[float] = field(default_factory=list)  # ? Seconds between the start of the train and each response
+    recovered_after: Optional[float] = None  # ? Seconds between the end of the train and the first response that wasn't limited
+
+
+async def run_train(
+    url: str,
+    *,
+    method: str = "GET",
+    headers: Optional[Dict[str, str]] = None,
+    auth: Optional[Tuple[str, str]] = None,
+    requests: int = 10,
+    rate: float = 10.0,
+    connections: int = 1,
+    http2: bool = False,
+    verify: bool = True,
+    is_limited: Callable[[Optional[int]], bool] = lambda status: status == 429,
+    recovery_timeout: Optional[float] = None,
+) -> TrainResult:
+    """Send a train of requests, the i-th one being sent exactly i / rate seconds after the first one on the monotonic clock.
+
+    Requests are launched on their slot whether or not the previous ones are done, only the number of connections bounds them.
+    When a recovery timeout is set, the URL is then probed at the same rate until a response isn't limited anymore."""
+    result = TrainResult(statuses=[None] * requests, offsets=[0.0] * requests)
+    loop = get_running_loop()
+
+    async with AsyncClient(
+        http1=not http2,
+        http2=http2,
+        verify=verify,
+        headers=headers,
+        auth=auth,
+        timeout=Timeout(10, pool=None),
+        limits=Limits(max_connections=connections, max_keepalive_connections=connections),
+    ) as client:
+
+        async def send(index: int, scheduled: float):
+            if scheduled > loop.time():
+                await sleep(scheduled - loop.time())
+            try:
+                result.statuses[index] = (await client.request(method, url)).status_code
+            except Exception:
+                result.statuses[index] = None
+            result.offsets[index] = loop.time() - start
+
+        start = loop.time()
+        await gather(*(create_task(send(index, start + index / rate)) for index in range(requests)))
+
+        if recovery_timeout is not None:
+            end = loop.time()
+            while loop.time() - end <= recovery_timeout:
+                try:
+                    status = (await client.request(method, url)).status_code
+                except Exception:
+                    status = None
+                if status is not None and not is_limited(status):
+                    result.recovered_after = loop.time() - end
+                    break
+                await sleep(1 / rate)
+
+    return result
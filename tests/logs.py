@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from json import JSONDecodeError, dumps, loads
+from os import R_OK, access, sep
+from pathlib import Path
+from subprocess import run
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+LOGS_PATH = Path(sep, "var", "log", "bunkerweb")
+LOG_FILES = {"access": "access.log", "error": "error.log", "core": "core.log", "core-access": "core-access.log"}
+# ? Container and output streams (stdout, stderr) each log is written to with the Docker based integrations
+LOG_STREAMS = {"access": ("bunkerweb", True, False), "error": ("bunkerweb", False, True), "core": ("bw-core", True, True), "core-access": ("bw-core", True, False)}
+
+
+class LogTail(ABC):
+    """New lines of a log, read from a remembered position so that a check only costs the bytes written since the previous one.
+
+    The position is made of the identity of the log (inode or container ID), so that a rotated or recreated log is read from its
+    start again, and of an offset in it. The lines are read from a cursor and the position only moves when they are committed,
+    so that the lines following a match are left for the next check."""
+
+    def __init__(self, key: str, position: Optional[List[Any]] = None):
+        self.key = key
+        self.lock = Lock()  # ? Held by the check using the log, so that concurrent checks don't take each other's lines
+        self.identity, self.offset = position or (None, None)
+        self.cursor = self.offset
+        self.bytes_read = 0
+
+    @property
+    def position(self) -> List[Any]:
+        return [self.identity, self.offset]
+
+    def rewind(self):
+        """Move the cursor back to the committed position"""
+        self.cursor = self.offset
+
+    def commit(self, offset: Any):
+        self.offset = offset
+
+    @abstractmethod
+    def read(self) -> List[Tuple[str, Any]]:
+        """Return the complete lines written since the cursor, each one with the offset right after it, and move the cursor"""
+
+
+class FileTail(LogTail):
+    def __init__(self, key: str, path: Path, position: Optional[List[Any]] = None):
+        super().__init__(key, position)
+        self.path = path
+
+    def read(self) -> List[Tuple[str, Any]]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return []
+
+        # ? A truncated (by utils.sh) or rotated file is read from its start again
+        if self.identity != stat.st_ino or stat.st_size < (self.cursor or 0):
+            self.identity, self.offset, self.cursor = stat.st_ino, 0, 0
+        if stat.st_size == self.cursor:
+            return []
+
+        if access(self.path, R_OK):
+            with self.path.open("rb") as log:
+                log.seek(self.cursor)
+                data = log.read()
+        else:  # ? The logs of the Linux integration belong to nginx
+            data = run(["sudo", "tail", "-c", f"+{self.cursor + 1}", self.path.as_posix()], capture_output=True, check=True).stdout
+
+        data = data[: data.rfind(b"\n") + 1]  # ? The last line may still be being written
+        self.bytes_read += len(data)
+        lines = []
+        for line in data.splitlines(keepends=True):
+            self.cursor += len(line)
+            lines.append((line.decode(errors="replace").rstrip("\r\n"), self.cursor))
+        return lines
+
+
+def parse_timestamp(timestamp: str) -> Tuple[str, int]:
+    """Sortable form of a RFC 3339 timestamp of the Docker logs, whose fractional part has a variable length"""
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    return seconds, int(fraction.ljust(9, "0")[:9] or 0)
+
+
+class ContainerTail(LogTail):
+    """Lines of a container's logs, the offset is the timestamp of the last line read and the number of lines read with that
+    timestamp: the logs are asked since that timestamp, which the daemon includes, and those lines are skipped"""
+
+    def __init__(self, key: str, container: str, stdout: bool, stderr: bool, position: Optional[List[Any]] = None):
+        super().__init__(key, position)
+        self.container = container
+        self.stdout = stdout
+        self.stderr = stderr
+        self.client = None
+
+    def read(self) -> List[Tuple[str, Any]]:
+        if self.client is None:
+            from docker import from_env  # ? Only needed for the Docker based integrations
+
+            self.client = from_env()
+
+        from docker.errors import NotFound
+
+        try:
+            container = self.client.containers.get(self.container)
+        except NotFound:
+            return []
+
+        if self.identity != container.id:
+            self.identity, self.offset, self.cursor = container.id, None, None
+
+        since, since_epoch, skip = None, None, 0
+        if self.cursor:
+            since, skip = parse_timestamp(self.cursor[0]), self.cursor[1]
+            # ? The daemon only takes microseconds through the SDK, rounded down so that no line with the timestamp is left out
+            seconds = datetime.strptime(since[0], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+            since_epoch = seconds + (since[1] // 1000 - 1) / 1_000_000
+        data = container.logs(stdout=self.stdout, stderr=self.stderr, timestamps=True, since=since_epoch)
+        self.bytes_read += len(data)
+
+        lines = []
+        for line in data.decode(errors="replace").splitlines():
+            timestamp, _, text = line.partition(" ")
+            parsed = parse_timestamp(timestamp)
+            if since is not None and parsed < since:
+                continue
+            elif since is not None and parsed == since and skip:
+                skip -= 1
+                continue
+            self.cursor = [timestamp, self.cursor[1] + 1 if self.cursor and self.cursor[0] == timestamp else 1]
+            since, skip = parsed, 0
+            lines.append((text, self.cursor))
+        return lines
+
+
+class LogTails:
+    """Tails of the logs of the stack, indexed per log, whose positions are saved in the slot so that they are shared by every
+    action of a run, even the ones run by another process"""
+
+    def __init__(self, positions_path: Path, docker: bool, suffix: str = ""):
+        self.positions_path = positions_path
+        self.docker = docker
+        self.suffix = suffix
+        self.tails: Dict[str, LogTail] = {}
+        self.lock = Lock()
+
+        try:
+            self.positions: Dict[str, List[Any]] = loads(positions_path.read_text())
+        except (FileNotFoundError, JSONDecodeError):
+            self.positions = {}
+
+    def get(self, log: str) -> LogTail:
+        with self.lock:
+            if log not in self.tails:
+                if self.docker:
+                    container, stdout, stderr = LOG_STREAMS[log]
+                    key = f"{container}{self.suffix}:{log}"
+                    self.tails[log] = ContainerTail(key, f"{container}{self.suffix}", stdout, stderr, self.positions.get(key))
+                else:
+                    key = LOGS_PATH.joinpath(LOG_FILES[log]).as_posix()
+                    self.tails[log] = FileTail(key, LOGS_PATH.joinpath(LOG_FILES[log]), self.positions.get(key))
+            return self.tails[log]
+
+    def save(self, tail: LogTail):
+        with self.lock:
+            self.positions[tail.key] = tail.position
+            self.positions_path.parent.mkdir(parents=True, exist_ok=True)
+            self.positions_path.write_text(dumps(self.positions))
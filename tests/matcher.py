@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from functools import lru_cache
+from re import Pattern, compile as re_compile
+from typing import Dict, Iterable, List, Set, Tuple
+
+# ? Size of the decoded chunks fed to the matcher, compressed bodies would else be decoded in chunks of several MB
+CHUNK_SIZE = 65536
+# ? Up to this many literals, each one is looked for with str.find, which runs in C, the automaton only pays off for larger sets
+MAX_FIND_PATTERNS = 8
+# ? Regexes are matched on a sliding window over the body, so a regex match can't be longer than this
+REGEX_WINDOW = 65536
+
+
+class Automaton:
+    """Aho-Corasick automaton over a set of literal patterns.
+
+    The transitions of the underlying DFA are computed on demand and memoized, so feeding a character costs a single dict lookup
+    once the automaton is warm, and each pattern is found exactly once at the end of its first occurrence."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = tuple(patterns)
+        self.goto: List[Dict[str, int]] = [{}]
+        self.outputs: List[Set[int]] = [set()]
+
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.outputs.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.outputs[state].add(index)
+
+        # ? Breadth-first so that the failure link of a state is always computed before its children's
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0) if state else 0  # ? Children of the root fail back to it
+                self.outputs[child] |= self.outputs[self.fail[child]]
+                queue.append(child)
+
+        self.delta: List[Dict[str, int]] = [{} for _ in self.goto]
+
+    def step(self, state: int, char: str) -> int:
+        try:
+            return self.delta[state][char]
+        except KeyError:
+            pass
+
+        target = state
+        while target and char not in self.goto[target]:
+            target = self.fail[target]
+        next_state = self.goto[target].get(char, 0)
+        self.delta[state][char] = next_state
+        return next_state
+
+
+@lru_cache(maxsize=None)
+def get_automaton(patterns: Tuple[str, ...]) -> Automaton:
+    """Build the automaton of a set of literal patterns once per process"""
+    return Automaton(patterns)
+
+
+@lru_cache(maxsize=None)
+def get_regexes(patterns: Tuple[str, ...]) -> Tuple[Pattern, ...]:
+    return tuple(re_compile(pattern) for pattern in patterns)
+
+
+class BodyMatcher:
+    """Match required and forbidden patterns, literal or regex, incrementally over the chunks of a body with a bounded memory"""
+
+    def __init__(self, required: Iterable[str] = (), forbidden: Iterable[str] = (), required_rx: Iterable[str] = (), forbidden_rx: Iterable[str] = ()):
+        self.required = tuple(dict.fromkeys(required))
+        self.forbidden = tuple(dict.fromkeys(forbidden))
+        self.required_rx = tuple(dict.fromkeys(required_rx))
+        self.forbidden_rx = tuple(dict.fromkeys(forbidden_rx))
+
+        # ? Required and forbidden literals share the same automaton, the forbidden ones come after the required ones
+        self.patterns = self.required + self.forbidden
+        self.automaton = get_automaton(self.patterns) if len(self.patterns) > MAX_FIND_PATTERNS else None
+        self.regexes = get_regexes(self.required_rx + self.forbidden_rx)
+        # ? With str.find, the end of the previous chunks is kept so that literals spanning two chunks are found too
+        self.overlap = max((len(pattern) for pattern in self.patterns), default=1) - 1
+
+        self.state = 0
+        self.literal_tail = ""
+        self.tail = ""
+        self.scanned = 0
+        self.found: Set[int] = set()
+        self.found_rx: Set[int] = set()
+
+    @property
+    def missing(self) -> List[str]:
+        return [pattern for index, pattern in enumerate(self.required) if index not in self.found] + [
+            pattern for index, pattern in enumerate(self.required_rx) if index not in self.found_rx
+        ]
+
+    @property
+    def forbidden_found(self) -> List[str]:
+        return [self.patterns[index] for index in sorted(self.found) if index >= len(self.required)] + [
+            self.regexes[index].pattern for index in sorted(self.found_rx) if index >= len(self.required_rx)
+        ]
+
+    @property
+    def done(self) -> bool:
+        """Whether the rest of the body can't change the outcome anymore"""
+        return bool(self.forbidden_found) or (not self.missing and not self.forbidden and not self.forbidden_rx)
+
+    def feed(self, chunk: str):
+        self.scanned += len(chunk)
+
+        if self.automaton is None and len(self.found) < len(self.patterns):
+            window = self.literal_tail + chunk
+            for index, pattern in enumerate(self.patterns):
+                if index not in self.found and window.find(pattern) != -1:
+                    self.found.add(index)
+            self.literal_tail = window[-self.overlap :] if self.overlap else ""
+        elif self.automaton is not None and len(self.found) < len(self.patterns):
+            state, delta, step, outputs, found = self.state, self.automaton.delta, self.automaton.step, self.automaton.outputs, self.found
+            for char in chunk:
+                next_state = delta[state].get(char)
+                state = step(state, char) if next_state is None else next_state
+                if outputs[state]:
+                    found |= outputs[state]
+            self.state = state
+
+        if self.regexes and len(self.found_rx) < len(self.regexes):
+            # ? The tail of the previous chunks is kept so that matches spanning two chunks are found too
+            window = self.tail + chunk
+            for index, regex in enumerate(self.regexes):
+                if index not in self.found_rx and regex.search(window):
+                    self.found_rx.add(index)
+            self.tail = window[-REGEX_WINDOW:]
@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
+from collections import Counter, deque
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from itertools import takewhile
 from os import getenv
+from random import Random
+from time import perf_counter, time
+from typing import Iterator, List, Optional
 from uuid import uuid4
-from fastapi import APIRouter, FastAPI, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
+from zlib import compressobj
+from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 
 
 app = FastAPI()
@@ -13,29 +21,123 @@ list_router = APIRouter(prefix="/list")
 bunkernet_router = APIRouter(prefix="/bunkernet")
 
 
+# ? Entries always served first, the generated ones (?size=N&seed=S) come after them
+LIST_HEADS = {
+    "ip": lambda: ["192.168.0.254", "10.0.0.0/8", "127.0.0.0/24"],
+    "rdns": lambda: [".example.com", ".example.org", ".bw-services"],
+    "asn": lambda: ["1234", getenv("AS_NUMBER", "3356"), "5678"],
+    "user_agent": lambda: ["BunkerBot", "CensysInspect", "ShodanInspect", "ZmEu", "masscan"],
+    "uri": lambda: ["/admin", "/login"],
+}
+# ? Generated entries never match the clients of the tests: addresses from 100.64.0.0/10, private 32-bit ASNs, .invalid domains
+LIST_GENERATORS = {
+    "ip": lambda rand: f"100.{64 + rand.getrandbits(6)}.{rand.getrandbits(8)}.{rand.getrandbits(8)}",
+    "rdns": lambda rand: f".host-{rand.getrandbits(32):08x}.invalid",
+    "asn": lambda rand: str(4200000000 + rand.getrandbits(26)),
+    "user_agent": lambda rand: f"GeneratedBot-{rand.getrandbits(32):08x}/1.0",
+    "uri": lambda rand: f"/generated/{rand.getrandbits(32):08x}",
+}
+LIST_CHUNK_LINES = 4096
+LAST_MODIFIED = int(getenv("LISTS_LAST_MODIFIED", int(time())))
+list_stats = {}
+
+
+def get_list_stats(kind: str) -> dict:
+    return list_stats.setdefault(kind, {"downloads": 0, "not_modified": 0, "bytes": 0, "lines": 0, "last_duration": None})
+
+
+def generate_list(kind: str, size: int, seed: int, compress: bool) -> Iterator[bytes]:
+    stats = get_list_stats(kind)
+    start = perf_counter()
+    rand = Random(f"{kind}:{seed}")
+    generator = LIST_GENERATORS[kind]
+    compressor = compressobj(wbits=31) if compress else None  # ? wbits=31 writes a gzip container
+
+    lines = LIST_HEADS[kind]()
+    remaining = size
+    while True:
+        chunk = ("\n".join(lines) + ("\n" if remaining else "")).encode()
+        stats["lines"] += len(lines)
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            stats["bytes"] += len(chunk)
+            yield chunk
+        if not remaining:
+            break
+        lines = [generator(rand) for _ in range(min(remaining, LIST_CHUNK_LINES))]
+        remaining -= len(lines)
+
+    if compressor:
+        chunk = compressor.flush()
+        stats["bytes"] += len(chunk)
+        yield chunk
+    stats["last_duration"] = round(perf_counter() - start, 3)
+
+
+def serve_list(kind: str, request: Request, size: int, seed: int):
+    stats = get_list_stats(kind)
+    # ? The lists are a function of their parameters only, so the ETag doesn't need their content
+    etag = f'"{kind}-{size}-{seed}-{LAST_MODIFIED}"'
+    headers = {"ETag": etag, "Last-Modified": formatdate(LAST_MODIFIED, usegmt=True), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("If-None-Match")
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_none_match is not None:
+        not_modified = etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*"
+    elif if_modified_since is not None:
+        try:
+            not_modified = parsedate_to_datetime(if_modified_since).timestamp() >= LAST_MODIFIED
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+
+    if not_modified:
+        stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    stats["downloads"] += 1
+    compress = "gzip" in request.headers.get("Accept-Encoding", "")
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(generate_list(kind, max(size, 0), seed, compress), media_type="text/plain", headers=headers)
+
+
 @list_router.get("/ip")
-async def ip(_: Request):
-    return PlainTextResponse("192.168.0.254\n10.0.0.0/8\n127.0.0.0/24")
+async def ip(request: Request, size: int = 0, seed: int = 0):
+    return serve_list("ip", request, size, seed)
 
 
 @list_router.get("/rdns")
-async def rdns(_: Request):
-    return PlainTextResponse(".example.com\n.example.org\n.bw-services")
+async def rdns(request: Request, size: int = 0, seed: int = 0):
+    return serve_list("rdns", request, size, seed)
 
 
 @list_router.get("/asn")
-async def asn(_: Request):
-    return PlainTextResponse(f"1234\n{getenv('AS_NUMBER', '3356')}\n5678")
+async def asn(request: Request, size: int = 0, seed: int = 0):
+    return serve_list("asn", request, size, seed)
 
 
 @list_router.get("/user_agent")
-async def user_agent(_: Request):
-    return PlainTextResponse("BunkerBot\nCensysInspect\nShodanInspect\nZmEu\nmasscan")
+async def user_agent(request: Request, size: int = 0, seed: int = 0):
+    return serve_list("user_agent", request, size, seed)
 
 
 @list_router.get("/uri")
-async def uri(_: Request):
-    return PlainTextResponse("/admin\n/login")
+async def uri(request: Request, size: int = 0, seed: int = 0):
+    return serve_list("uri", request, size, seed)
+
+
+@list_router.get("/stats")
+async def stats(_: Request):
+    return JSONResponse(status_code=200, content={"result": "ok", "data": {kind: get_list_stats(kind) for kind in LIST_HEADS}})
+
+
+@list_router.post("/reset")
+async def reset_lists(_: Request):
+    list_stats.clear()
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "Reset done."})
 
 
 @bunkernet_router.get("/ping")
@@ -51,16 +153,138 @@ async def register(_: Request):
     return JSONResponse(status_code=200, content={"result": "ok", "data": instance_id})
 
 
-@bunkernet_router.post("/report")
-async def report(_: Request):
+# ? Reports are kept in a ring buffer, the aggregates are bounded too so that an attack can't exhaust the memory of the API
+REPORTS_CAPACITY = int(getenv("BUNKERNET_REPORTS_CAPACITY", "10000"))
+MAX_REPORTED_IPS = int(getenv("BUNKERNET_MAX_IPS", "10000"))
+BATCHES_CAPACITY = 1000
+reports = deque(maxlen=REPORTS_CAPACITY)  # ? (received_at, ip, reason)
+batches = deque(maxlen=BATCHES_CAPACITY)  # ? (received_at, number of reports)
+latencies = deque(maxlen=REPORTS_CAPACITY)  # ? Seconds between the report and its reception, when the report is dated
+ip_counts = Counter()
+reason_counts = Counter()
+ingestion_stats = {"invalid": 0, "untracked_ips": 0}
+
+
+def ingest_report(data, received_at: float):
     global report_num
     report_num += 1
-    return JSONResponse(status_code=200, content={"result": "ok", "data": "Report acknowledged."})
+
+    if not isinstance(data, dict):
+        ingestion_stats["invalid"] += 1
+        data = {}
+
+    ip = str(data.get("ip", "unknown"))
+    reason = str(data.get("reason", "unknown"))
+    reports.append((received_at, ip, reason))
+    reason_counts[reason] += 1
+
+    if ip in ip_counts or len(ip_counts) < MAX_REPORTED_IPS:
+        ip_counts[ip] += 1
+    else:
+        ingestion_stats["untracked_ips"] += 1
+
+    date = data.get("date", data.get("timestamp"))
+    try:
+        reported_at = float(date) if isinstance(date, (int, float)) else datetime.fromisoformat(str(date)).timestamp() if date else None
+    except ValueError:
+        reported_at = None
+    if reported_at is not None:
+        latencies.append(max(received_at - reported_at, 0.0))
+
+
+async def ingest_batch(request: Request, batch: bool):
+    received_at = time()
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    if batch:
+        data = data.get("reports") if isinstance(data, dict) else data
+        if not isinstance(data, list):
+            return JSONResponse(status_code=400, content={"result": "error", "data": "A list of reports is expected."})
+    else:
+        data = [data]
+
+    for report_data in data:
+        ingest_report(report_data, received_at)
+    batches.append((received_at, len(data)))
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "Report acknowledged." if not batch else f"{len(data)} report(s) acknowledged."})
+
+
+@bunkernet_router.post("/report")
+async def report(request: Request):
+    return await ingest_batch(request, False)
+
+
+@bunkernet_router.post("/report/batch")
+async def report_batch(request: Request):
+    return await ingest_batch(request, True)
+
+
+def get_summary(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "min": values[0],
+        "avg": round(sum(values) / len(values), 6),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+@bunkernet_router.get("/stats")
+async def get_report_stats(window: float = 60.0, top: int = 10):
+    now = time()
+    # ? The buffer is ordered by reception, only its tail is read
+    recent = sum(1 for _ in takewhile(lambda report: now - report[0] <= window, reversed(reports)))
+    return JSONResponse(
+        status_code=200,
+        content={
+            "result": "ok",
+            "data": {
+                "reports": report_num,
+                "buffered": len(reports),
+                "invalid": ingestion_stats["invalid"],
+                "untracked_ips": ingestion_stats["untracked_ips"],
+                "rate": {"window": window, "reports": recent, "per_second": round(recent / window, 3) if window > 0 else None},
+                "batches": get_summary([size for _, size in batches]),
+                "latency": get_summary(list(latencies)),
+                "ips": dict(ip_counts.most_common(top)),
+                "reasons": dict(reason_counts.most_common(top)),
+            },
+        },
+    )
+
+
+@bunkernet_router.get("/reports")
+async def get_reports(ip: Optional[str] = None, reason: Optional[str] = None, limit: int = 100):
+    matching = [
+        {"received_at": received_at, "ip": report_ip, "reason": report_reason}
+        for received_at, report_ip, report_reason in reversed(reports)
+        if (ip is None or report_ip == ip) and (reason is None or report_reason == reason)
+    ]
+    return JSONResponse(status_code=200, content={"result": "ok", "data": matching[:limit]})
+
+
+def generate_db(size: int, seed: int) -> Iterator[bytes]:
+    rand = Random(f"db:{seed}")
+    generator = LIST_GENERATORS["ip"]
+    yield b'{"result": "ok", "data": ['
+    remaining = size
+    while remaining:
+        ips = [generator(rand) for _ in range(min(remaining, LIST_CHUNK_LINES))]
+        yield (", " if remaining != size else "").encode() + ", ".join(f'"{ip}"' for ip in ips).encode()
+        remaining -= len(ips)
+    yield b"]}"
 
 
 @bunkernet_router.get("/db")
-async def db(_: Request):
-    return JSONResponse(status_code=200, content={"result": "ok", "data": []})
+async def db(size: int = int(getenv("BUNKERNET_DB_SIZE", "0")), seed: int = 0):
+    return StreamingResponse(generate_db(max(size, 0), seed), media_type="application/json")
 
 
 @bunkernet_router.get("/instance_id")
@@ -82,6 +306,9 @@ async def reset(_: Request):
     global instance_id, report_num
     instance_id = None
     report_num = 0
+    for buffer in (reports, batches, latencies, ip_counts, reason_counts):
+        buffer.clear()
+    ingestion_stats.update(invalid=0, untracked_ips=0)
     return JSONResponse(status_code=200, content={"result": "ok", "data": "Reset done."})
 
 
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# ? Stand-in for the API of bw-core, only the part used to hot reload the stacks: python3 tests/misc/core-api/main.py
+from asyncio import sleep
+from os import getenv
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+app = FastAPI()
+settings = {}
+reloads = {}
+token = getenv("CORE_TOKEN", "S3cr3tT0k3n!")
+reload_delay = float(getenv("RELOAD_DELAY", "1"))
+failing_settings = {setting for setting in getenv("FAILING_SETTINGS", "").split(",") if setting}
+
+
+@app.middleware("http")
+async def check_token(request: Request, call_next):
+    if request.headers.get("Authorization") != f"Bearer {token}":
+        return JSONResponse(status_code=403, content={"status": "error", "msg": "Invalid token"})
+    return await call_next(request)
+
+
+@app.get("/config")
+async def get_config(_: Request):
+    return JSONResponse(status_code=200, content={"status": "success", "data": settings})
+
+
+@app.patch("/config")
+async def patch_config(request: Request):
+    data = await request.json()
+    for setting, value in data.get("settings", {}).items():
+        if value is None:
+            settings.pop(setting, None)
+        else:
+            settings[setting] = value
+    return JSONResponse(status_code=200, content={"status": "success", "msg": f"{len(data.get('settings', {}))} setting(s) updated"})
+
+
+async def apply_reload(reload_id: int):
+    await sleep(reload_delay)
+    reloads[reload_id] = "failed" if failing_settings & set(settings) else "done"
+
+
+@app.post("/reload")
+async def reload(_: Request, background_tasks: BackgroundTasks):
+    reload_id = len(reloads) + 1
+    reloads[reload_id] = "pending"
+    background_tasks.add_task(apply_reload, reload_id)
+    return JSONResponse(status_code=202, content={"status": "success", "data": {"id": reload_id}})
+
+
+@app.get("/reload/{reload_id}")
+async def get_reload(reload_id: int):
+    if reload_id not in reloads:
+        return JSONResponse(status_code=404, content={"status": "error", "msg": "Reload not found"})
+    return JSONResponse(status_code=200, content={"status": "success", "data": {"state": reloads[reload_id]}})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=int(getenv("PORT", "1337")))
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# ? Programmable DNS responder (UDP and TCP) counting the queries it gets, an alternative to dnsmasq: python3 main.py --hosts dnsmasq.hosts
+from argparse import ArgumentParser
+from asyncio import DatagramProtocol, IncompleteReadError, StreamReader, StreamWriter, gather, get_running_loop, run, sleep, start_server, wait_for
+from collections import Counter
+from ipaddress import ip_address
+from logging import INFO, basicConfig, getLogger
+from pathlib import Path
+from struct import pack, unpack_from
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=INFO)
+
+LOGGER = getLogger("DNS")
+
+TYPES = {"A": 1, "PTR": 12, "TXT": 16, "AAAA": 28}
+TYPE_NAMES = {value: key for key, value in TYPES.items()}
+NOERROR, FORMERR, SERVFAIL, NXDOMAIN, NOTIMP = 0, 1, 2, 3, 4
+
+parser = ArgumentParser(description="Programmable DNS responder with query counters")
+parser.add_argument("--host", default="0.0.0.0", help="Address the DNS server and the HTTP API listen on")
+parser.add_argument("--port", type=int, default=53, help="Port of the DNS server (UDP and TCP)")
+parser.add_argument("--api-port", type=int, default=8053, help="Port of the HTTP API")
+parser.add_argument("--hosts", action="append", default=[], help="Hosts file (dnsmasq format) to load A and PTR records from")
+parser.add_argument("--upstream", default="", help="DNS server the names without records are forwarded to (default: answer NXDOMAIN)")
+parser.add_argument("--ttl", type=int, default=0, help="TTL of the answers, 0 so that only the cache of the client is tested")
+
+app = FastAPI()
+# ? name -> type -> values, names are lower case without the trailing dot and can start with a "*." wildcard
+records: Dict[str, Dict[str, List[str]]] = {}
+nxdomains = set()
+latencies: Dict[str, float] = {}  # ? name -> seconds, "*" applies to every name
+queries = Counter()  # ? (name, type) -> count
+upstream: Optional[Tuple[str, int]] = None
+ttl = 0
+
+
+def normalize(name: str) -> str:
+    return name.lower().rstrip(".")
+
+
+def add_record(name: str, record_type: str, value: str):
+    values = records.setdefault(normalize(name), {}).setdefault(record_type, [])
+    if value not in values:
+        values.append(value)
+
+
+def load_hosts(path: str):
+    """Load a hosts file: an A record for each name and a PTR record for the address"""
+    for line in Path(path).read_text().splitlines():
+        fields = line.split("#", 1)[0].split()
+        if len(fields) < 2:
+            continue
+        for name in fields[1:]:
+            add_record(name, "A", fields[0])
+        add_record(ip_address(fields[0]).reverse_pointer, "PTR", fields[1])
+
+
+def find(name: str) -> Optional[Dict[str, List[str]]]:
+    """Return the records of a name, from the closest wildcard if the name has none"""
+    if name in records:
+        return records[name]
+    labels = name.split(".")
+    for index in range(1, len(labels)):
+        wildcard = "*." + ".".join(labels[index:])
+        if wildcard in records:
+            return records[wildcard]
+    return None
+
+
+def read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Read a (possibly compressed) name, return it and the offset right after it"""
+    labels = []
+    end = None
+    for _ in range(128):  # ? Bounded so that a pointer loop can't hang the server
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            end = end or offset + 2
+            offset = unpack_from("!H", data, offset)[0] & 0x3FFF
+        elif length:
+            labels.append(data[offset + 1 : offset + 1 + length].decode("ascii", "replace"))
+            offset += 1 + length
+        else:
+            return ".".join(labels), end or offset + 1
+    raise ValueError("Name too long")
+
+
+def encode_name(name: str) -> bytes:
+    return b"".join(bytes([len(label)]) + label.encode() for label in name.split(".") if label) + b"\0"
+
+
+def encode_rdata(record_type: str, value: str) -> bytes:
+    if record_type == "A":
+        return ip_address(value).packed
+    elif record_type == "PTR":
+        return encode_name(value)
+    encoded = value.encode()
+    return b"".join(bytes([len(encoded[index : index + 255])]) + encoded[index : index + 255] for index in range(0, max(len(encoded), 1), 255))
+
+
+def build_response(query: bytes, rcode: int, answers: List[Tuple[int, bytes]] = (), question_end: int = 12, recursion: bool = False) -> bytes:
+    query_id, flags = unpack_from("!HH", query)
+    # ? QR, the opcode and RD of the query, AA and RA when the names are forwarded
+    flags = 0x8000 | (flags & 0x7900) | 0x0400 | (0x0080 if recursion else 0) | rcode
+    response = pack("!HHHHHH", query_id, flags, 1 if question_end > 12 else 0, len(answers), 0, 0) + query[12:question_end]
+    for record_type, rdata in answers:
+        response += pack("!HHHIH", 0xC00C, record_type, 1, ttl, len(rdata)) + rdata  # ? 0xC00C points to the name of the question
+    return response
+
+
+async def forward(query: bytes) -> Optional[bytes]:
+    loop = get_running_loop()
+    future = loop.create_future()
+
+    class Forwarder(DatagramProtocol):
+        def datagram_received(self, data, _):
+            if not future.done():
+                future.set_result(data)
+
+    transport, _ = await loop.create_datagram_endpoint(Forwarder, remote_addr=upstream)
+    try:
+        transport.sendto(query)
+        return await wait_for(future, 5)
+    except TimeoutError:
+        return None
+    finally:
+        transport.close()
+
+
+async def resolve(query: bytes) -> Optional[bytes]:
+    """Answer a DNS query, None if it can't be parsed at all"""
+    if len(query) < 12:
+        return None
+
+    query_id, flags, question_count = unpack_from("!HHH", query)
+    if flags & 0x7800:
+        return build_response(query, NOTIMP)
+    try:
+        name, offset = read_name(query, 12)
+        record_type = unpack_from("!H", query, offset)[0]
+    except (IndexError, ValueError, UnicodeError):
+        return build_response(query, FORMERR)
+    question_end = offset + 4
+
+    name = normalize(name)
+    type_name = TYPE_NAMES.get(record_type, str(record_type))
+    queries[(name, type_name)] += 1
+
+    delay = latencies.get(name, latencies.get("*", 0.0))
+    if delay:
+        await sleep(delay)
+
+    if name in nxdomains:
+        return build_response(query, NXDOMAIN, question_end=question_end)
+
+    found = find(name)
+    if found is None and upstream is not None:
+        return await forward(query) or build_response(query, SERVFAIL, question_end=question_end, recursion=True)
+    elif found is None:
+        return build_response(query, NXDOMAIN, question_end=question_end)
+
+    # ? A name without records of the asked type gets an empty answer (NODATA)
+    answers = [(record_type, encode_rdata(type_name, value)) for value in found.get(type_name, [])]
+    return build_response(query, NOERROR, answers, question_end, upstream is not None)
+
+
+class UdpServer(DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        get_running_loop().create_task(self.answer(data, addr))
+
+    async def answer(self, data, addr):
+        response = await resolve(data)
+        if response is not None:
+            self.transport.sendto(response, addr)
+
+
+async def handle_tcp(reader: StreamReader, writer: StreamWriter):
+    try:
+        while True:
+            length = unpack_from("!H", await reader.readexactly(2))[0]
+            response = await resolve(await reader.readexactly(length))
+            if response is None:
+                break
+            writer.write(pack("!H", len(response)) + response)
+            await writer.drain()
+    except (IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+@app.get("/records")
+async def get_records():
+    return JSONResponse(status_code=200, content={"result": "ok", "data": {"records": records, "nxdomains": sorted(nxdomains), "latencies": latencies}})
+
+
+@app.post("/records")
+async def post_record(request: Request):
+    data = await request.json()
+    record_type = str(data.get("type", "A")).upper()
+    if record_type not in ("A", "PTR", "TXT") or not data.get("name") or data.get("value") is None:
+        return JSONResponse(status_code=400, content={"result": "error", "data": "A name, a type (A, PTR or TXT) and a value are expected."})
+    try:
+        encode_rdata(record_type, data["value"])
+    except ValueError:
+        return JSONResponse(status_code=400, content={"result": "error", "data": f"Invalid {record_type} value."})
+    add_record(data["name"], record_type, data["value"])
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "Record added."})
+
+
+@app.delete("/records")
+async def delete_records(name: str, type: Optional[str] = None):
+    if type is None:
+        records.pop(normalize(name), None)
+    else:
+        records.get(normalize(name), {}).pop(type.upper(), None)
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "Records deleted."})
+
+
+@app.post("/nxdomain")
+async def post_nxdomain(request: Request):
+    data = await request.json()
+    name = normalize(data.get("name", ""))
+    if data.get("enabled", True):
+        nxdomains.add(name)
+    else:
+        nxdomains.discard(name)
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "NXDOMAIN updated."})
+
+
+@app.post("/latency")
+async def post_latency(request: Request):
+    data = await request.json()
+    name = normalize(data.get("name", "*")) or "*"
+    if float(data.get("delay", 0)) > 0:
+        latencies[name] = float(data["delay"])
+    else:
+        latencies.pop(name, None)
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "Latency updated."})
+
+
+@app.get("/queries")
+async def get_queries(name: Optional[str] = None):
+    counts = {}
+    for (query_name, type_name), count in queries.items():
+        if name is None or query_name == normalize(name) or query_name.endswith("." + normalize(name)):
+            counts.setdefault(query_name, {})[type_name] = count
+    return JSONResponse(status_code=200, content={"result": "ok", "data": {"total": sum(sum(types.values()) for types in counts.values()), "names": counts}})
+
+
+@app.post("/reset")
+async def reset():
+    queries.clear()
+    return JSONResponse(status_code=200, content={"result": "ok", "data": "Reset done."})
+
+
+async def main():
+    global upstream, ttl
+    args = parser.parse_args()
+    ttl = args.ttl
+    if args.upstream:
+        upstream = (args.upstream, 53)
+    for path in args.hosts:
+        load_hosts(path)
+
+    import uvicorn
+
+    loop = get_running_loop()
+    await loop.create_datagram_endpoint(UdpServer, local_addr=(args.host, args.port))
+    tcp_server = await start_server(handle_tcp, args.host, args.port)
+    api_server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.api_port))
+
+    LOGGER.info(f"DNS server listening on {args.host}:{args.port} (UDP and TCP), HTTP API on port {args.api_port}")
+    await gather(tcp_server.serve_forever(), api_server.serve())
+
+
+if __name__ == "__main__":
+    run(main())
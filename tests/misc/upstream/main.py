@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# ? Synthetic HTTP/1.1 upstream for the performance tests, shaped per request through query parameters: python3 main.py
+#
+# GET /anything?size=1024&latency=normal:10,2&chunk=4096&chunk_delay=5&entropy=0.5&status=200&header=X-A:b&content_type=text/html
+#   size          body size in bytes (default 1024)
+#   latency       delay before answering, in ms: "10", "fixed:10", "uniform:5,20", "normal:10,2" or "exp:10" (mean)
+#   chunk         send the body with the chunked transfer encoding, in chunks of this many bytes
+#   chunk_delay   delay between two chunks, in ms
+#   entropy       share of random (incompressible) bytes in the body, from 0 (only "a") to 1 (default 0)
+#   status        status code (default 200)
+#   header        extra response header, "Name:Value", can be repeated
+#   content_type  content type (default text/plain)
+# GET /__stats returns the request counters as JSON, POST /__reset resets them
+from argparse import ArgumentParser
+from asyncio import IncompleteReadError, LimitOverrunError, StreamReader, StreamWriter, run, sleep, start_server
+from functools import lru_cache
+from http import HTTPStatus
+from json import dumps
+from logging import INFO, basicConfig, getLogger
+from os import getenv
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=INFO)
+
+LOGGER = getLogger("UPSTREAM")
+
+BLOCK_SIZE = 65536
+
+parser = ArgumentParser(description="Synthetic HTTP/1.1 upstream shaped through query parameters")
+parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+parser.add_argument("--seed", type=int, default=int(getenv("UPSTREAM_SEED", "0")), help="Seed of the latencies and of the random bytes of the bodies")
+
+# ? The latencies are drawn from a single seeded generator, so a run always sees the same sequence
+rand = Random()
+random_block = b""
+stats = {"requests": 0, "responses": {}, "bytes": 0, "connections": 0, "started": perf_counter()}
+
+
+def get_delay(latency: str) -> float:
+    """Delay in seconds drawn from a latency specification in milliseconds"""
+    kind, _, params = latency.partition(":") if ":" in latency else ("fixed", "", latency)
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "fixed":
+        delay = values[0]
+    elif kind == "uniform":
+        delay = rand.uniform(values[0], values[1])
+    elif kind == "normal":
+        delay = rand.gauss(values[0], values[1])
+    elif kind == "exp":
+        delay = rand.expovariate(1 / values[0]) if values[0] else 0.0
+    else:
+        raise ValueError(f"Unknown latency distribution {kind}")
+    return max(delay, 0.0) / 1000
+
+
+@lru_cache(maxsize=16)
+def get_block(entropy: float) -> bytes:
+    """Block the bodies are made of: the given share of random bytes spread over it, "a" everywhere else"""
+    random_bytes = int(BLOCK_SIZE * min(max(entropy, 0.0), 1.0))
+    if random_bytes == 0:
+        return b"a" * BLOCK_SIZE
+    # ? Random runs of 64 bytes, so that the compressors can't just skip over a single large random area
+    runs = random_bytes // 64
+    step = BLOCK_SIZE // max(runs, 1)
+    block = bytearray(b"a" * BLOCK_SIZE)
+    for index in range(runs):
+        block[index * step : index * step + 64] = random_block[index * 64 : index * 64 + 64]
+    return bytes(block)
+
+
+def iter_body(size: int, chunk: int, entropy: float):
+    block = get_block(entropy)
+    wrapped = memoryview(block * 2)  # ? Any slice of at most a block, wherever it starts, is a view of this buffer
+    chunk = chunk or BLOCK_SIZE
+    sent = 0
+    while sent < size:
+        length = min(chunk, size - sent)
+        offset = sent % BLOCK_SIZE
+        yield wrapped[offset : offset + length] if length <= BLOCK_SIZE else (block[offset:] + block * (length // BLOCK_SIZE + 1))[:length]
+        sent += length
+
+
+async def read_body(reader: StreamReader, headers: Dict[str, str]):
+    """Read and discard the body of the request so that the connection can be reused"""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                return
+    elif int(headers.get("content-length", "0") or 0):
+        await reader.readexactly(int(headers["content-length"]))
+
+
+def build_head(status: int, headers: List[Tuple[str, str]]) -> bytes:
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = "Unknown"
+    return (f"HTTP/1.1 {status} {reason}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n").encode()
+
+
+async def handle(reader: StreamReader, writer: StreamWriter):
+    stats["connections"] += 1
+    try:
+        while True:
+            try:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                await read_body(reader, headers)
+            except (ValueError, LimitOverrunError):
+                writer.write(build_head(400, [("Content-Length", "0"), ("Connection", "close")]))
+                return
+
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            await respond(writer, method, target, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                return
+    except (IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def respond(writer: StreamWriter, method: str, target: str, keep_alive: bool):
+    split = urlsplit(target)
+    params = parse_qsl(split.query)
+    query = dict(params)
+    connection = [("Connection", "keep-alive" if keep_alive else "close")]
+
+    if split.path == "/__stats":
+        body = dumps({key: value for key, value in stats.items() if key != "started"} | {"uptime": round(perf_counter() - stats["started"], 3)}).encode()
+        writer.write(build_head(200, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))] + connection) + body)
+        return
+    elif split.path == "/__reset" and method == "POST":
+        stats.update(requests=0, responses={}, bytes=0, connections=0, started=perf_counter())
+        writer.write(build_head(204, connection))
+        return
+
+    stats["requests"] += 1
+    try:
+        size = max(int(query.get("size", 1024)), 0)
+        chunk = max(int(query.get("chunk", 0)), 0)
+        chunk_delay = float(query.get("chunk_delay", 0)) / 1000
+        entropy = float(query.get("entropy", 0))
+        status = int(query.get("status", 200))
+        delay = get_delay(query["latency"]) if "latency" in query else 0.0
+        extra_headers = [tuple(value.split(":", 1)) for name, value in params if name == "header" and ":" in value]
+    except (ValueError, IndexError, ZeroDivisionError) as e:
+        body = f"Invalid parameters: {e}\n".encode()
+        writer.write(build_head(400, [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))] + connection) + body)
+        return
+
+    stats["responses"][str(status)] = stats["responses"].get(str(status), 0) + 1
+    if delay:
+        await sleep(delay)
+
+    has_body = method != "HEAD" and status not in (204, 304)
+    headers = [("Content-Type", query.get("content_type", "text/plain")), ("X-Upstream-Request", str(stats["requests"]))] + extra_headers + connection
+    # ? Responses without a body (HEAD, 204, 304) don't announce one
+    if has_body:
+        headers.append(("Transfer-Encoding", "chunked") if chunk else ("Content-Length", str(size)))
+    writer.write(build_head(status, headers))
+
+    if not has_body:
+        return
+
+    for index, data in enumerate(iter_body(size, chunk, entropy)):
+        if chunk:
+            if index and chunk_delay:
+                await writer.drain()
+                await sleep(chunk_delay)
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        else:
+            writer.write(data)
+            await writer.drain()
+        stats["bytes"] += len(data)
+    if chunk:
+        writer.write(b"0\r\n\r\n")
+
+
+async def main():
+    global random_block
+    args = parser.parse_args()
+    rand.seed(args.seed)
+    random_block = Random(args.seed).randbytes(BLOCK_SIZE)
+
+    server = await start_server(handle, args.host, args.port)
+    LOGGER.info(f"Upstream listening on {args.host}:{args.port}")
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+    run(main())
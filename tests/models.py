@@ -2,10 +2,10 @@
 # -*- coding: utf-8 -*-
 
 from re import match
-from typing import Dict, Literal, Optional, Set, Tuple
+from typing import Dict, List, Literal, Optional, Set, Tuple
 
 from lxml.etree import XPath
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ValidationInfo, field_validator, model_validator
 
 
 class ActionData(BaseModel):
@@ -24,15 +24,20 @@ class ActionData(BaseModel):
 
 
 class ActionBase(ActionData):
-    type: Literal["string", "path", "status", "header", "ssl"]
+    type: Literal["string", "path", "status", "header", "ssl", "load", "rate", "log", "redis", "db"]
     url: str
     method: Literal["GET", "OPTIONS", "HEAD", "POST", "PUT", "PATCH", "DELETE"] = "GET"
     headers: Dict[str, str] = {}
     auth: Optional[Tuple[str, str]] = None
     body_length: int = 0  # ? If body_length is 0, then no body is sent Else, will send the letter "a" body_length times
+    body_chunked: bool = False  # ? If body_chunked is True, the body is sent with the chunked transfer encoding instead of with a Content-Length
     follow_redirects: bool = False
     verify_ssl: bool = True
     http2: bool = False
+    converge: bool = False  # ? If converge is True, the check is retried with an exponential backoff until it passes or the timeout is reached, instead of waiting for the delay
+    converge_successes: int = 1  # ? Number of consecutive passing checks needed before the action converges
+    barrier: bool = False  # ? When running concurrently, a barrier waits for every previous action and the next ones wait for it (actions with a delay, load and rate actions are barriers too)
+    after: List[str] = []  # ? When running concurrently, actions that must be done before this one
 
     @field_validator("headers")
     @classmethod
@@ -44,11 +49,18 @@ class ActionBase(ActionData):
 
     @field_validator("http2")  # TODO: Remove this when HTTP/2 is supported over HTTP
     @classmethod
-    def check_http2(cls, v: bool) -> bool:
-        if cls.url.startswith("http://") and v:
+    def check_http2(cls, v: bool, info: ValidationInfo) -> bool:
+        if info.data.get("url", "").startswith("http://") and v:
             raise ValueError("http2 must be False if the URL is not HTTPS as HTTP/2 is not supported over HTTP yet")
         return v
 
+    @field_validator("converge_successes")
+    @classmethod
+    def check_converge_successes(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError("converge_successes must be at least 1")
+        return v
+
 
 class Action(ActionBase):
     Docker: ActionData = ActionData()
@@ -63,6 +75,7 @@ class SeleniumAction(Action):
     method: Literal["GET"] = "GET"
     auth: None = None
     body_length: Literal[0] = 0
+    body_chunked: Literal[False] = False
     follow_redirects: Literal[True] = True
     verify_ssl: Literal[True] = True
     http2: Literal[False] = False
@@ -77,7 +90,24 @@ class SeleniumAction(Action):
 
 class String(Action):
     type: Literal["string"] = "string"
-    string: str
+    string: Optional[str] = None
+    strings: List[str] = []  # ? Every string that must be found in the response body
+    strings_rx: List[str] = []  # ? Every regex that must match the response body, over a sliding window of the body
+    forbidden_strings: List[str] = []  # ? Strings that must not be found in the response body
+    forbidden_strings_rx: List[str] = []  # ? Regexes that must not match the response body
+
+    @field_validator("strings_rx", "forbidden_strings_rx")
+    @classmethod
+    def check_strings_rx(cls, v: List[str]) -> List[str]:
+        for rx in v:
+            match(rx, "")
+        return v
+
+    @model_validator(mode="after")
+    def check_patterns(self) -> "String":
+        if self.string is None and not (self.strings or self.strings_rx or self.forbidden_strings or self.forbidden_strings_rx):
+            raise ValueError("At least one of string, strings, strings_rx, forbidden_strings or forbidden_strings_rx must be set")
+        return self
 
 
 class Path(Action):
@@ -130,11 +160,13 @@ class Header(Action):
 
 class Cookie(SeleniumAction):
     type: Literal["cookie"] = "cookie"
+    verify_ssl: bool = True
     cookie_name: str
     cookie_rx: Optional[str] = None  # ? If cookie_rx is None, then the cookie must not be present
     cookie_secure_flag: bool = False
     cookie_http_only_flag: bool = False
     cookie_same_site_flag: Optional[Literal["Strict", "Lax"]] = None
+    requires_js: bool = False  # ? If requires_js is False, the cookie is checked from the Set-Cookie headers of the redirect chain instead of in a browser
 
     @field_validator("cookie_name")
     @classmethod
@@ -152,17 +184,25 @@ class Cookie(SeleniumAction):
 
     @field_validator("cookie_secure_flag")
     @classmethod
-    def check_cookie_secure_flag(cls, v: bool) -> bool:
-        if cls.url.startswith("http://") and v:
+    def check_cookie_secure_flag(cls, v: bool, info: ValidationInfo) -> bool:
+        if info.data.get("url", "").startswith("http://") and v:
             raise ValueError("cookie_secure_flag must be False if the URL is not HTTPS")
         return v
 
+    @field_validator("requires_js")
+    @classmethod
+    def check_requires_js(cls, v: bool, info: ValidationInfo) -> bool:
+        if v and not info.data.get("verify_ssl", True):
+            raise ValueError("verify_ssl must be True if the cookie is checked in a browser")
+        return v
+
 
 class Ssl(Action):
     type: Literal["ssl"] = "ssl"
     ssl_protocols: Set[Literal["TLSv1", "TLSv1.1", "TLSv1.2", "TLSv1.3"]] = {"TLSv1.2", "TLSv1.3"}
     ssl_expiration: int = 365
     ssl_subject: str = "/CN=www.example.com/"
+    ssl_probe: bool = False  # ? If ssl_probe is True, every TLS version is also tried on its own: only the ones in ssl_protocols must be accepted
 
     @field_validator("url")
     @classmethod
@@ -170,3 +210,138 @@ class Ssl(Action):
         if not v.startswith("https://"):
             raise ValueError("The URL must be HTTPS when using the ssl type")
         return v
+
+
+class Load(Action):
+    type: Literal["load"] = "load"
+    connections: int = 10  # ? Number of concurrent connections (or concurrent streams with HTTP/2)
+    rate: Optional[float] = None  # ? Requests per second over all the connections, if rate is None, requests are sent as fast as possible
+    duration: float = 10.0
+    load_status: int = 200  # ? Responses with another status code count as errors
+    max_p50: Optional[float] = None  # ? Latency thresholds are in milliseconds
+    max_p99: Optional[float] = None
+    max_latency: Optional[float] = None
+    min_rps: Optional[float] = None
+    max_error_rate: float = 0.0  # ? Ratio of errors allowed, between 0 and 1
+
+    @field_validator("connections")
+    @classmethod
+    def check_connections(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError("connections must be at least 1")
+        return v
+
+    @field_validator("rate", "duration")
+    @classmethod
+    def check_positive(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v <= 0:
+            raise ValueError("rate and duration must be positive")
+        return v
+
+    @field_validator("max_error_rate")
+    @classmethod
+    def check_max_error_rate(cls, v: float) -> float:
+        if not 0 <= v <= 1:
+            raise ValueError("max_error_rate must be between 0 and 1")
+        return v
+
+
+class Rate(Action):
+    type: Literal["rate"] = "rate"
+    requests: int = 10  # ? Number of requests in the train
+    rate: float = 10.0  # ? Requests per second, the train is scheduled on a monotonic clock
+    connections: int = 1  # ? Maximum number of parallel connections used to send the train
+    limited_status: int = 429  # ? Status code of the requests that are limited (usually 429 or 503)
+    limited_after: Optional[int] = None  # ? Number of requests passing before the first limited one, if limited_after is None, no request must be limited
+    limited_tolerance: int = 0  # ? How many requests the transition to limited_status may be off by
+    recovery_min: Optional[float] = None  # ? Minimum number of seconds after the train before requests stop being limited, without recovery_max the recovery is waited for until the timeout
+    recovery_max: Optional[float] = None  # ? Maximum number of seconds after the train before requests stop being limited
+
+    @field_validator("requests", "connections")
+    @classmethod
+    def check_at_least_one(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError("requests and connections must be at least 1")
+        return v
+
+    @field_validator("rate")
+    @classmethod
+    def check_rate(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError("rate must be positive")
+        return v
+
+    @field_validator("limited_status")
+    @classmethod
+    def check_limited_status(cls, v: int) -> int:
+        if v < 100 or v > 599:
+            raise ValueError("Status code must be between 100 and 599")
+        return v
+
+
+class Log(Action):
+    type: Literal["log"] = "log"
+    url: str = ""  # ? If url is set, its request is sent first (its response isn't checked) to trigger what must be logged
+    log: Literal["access", "error", "core", "core-access"] = "error"
+    log_rx: str
+    log_count: int = 1  # ? Number of new lines that must match log_rx before the timeout, if log_count is 0, no new line must match it
+
+    @field_validator("log_rx")
+    @classmethod
+    def check_log_rx(cls, v: str) -> str:
+        match(v, "")
+        return v
+
+    @field_validator("log_count")
+    @classmethod
+    def check_log_count(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError("log_count must be at least 0")
+        return v
+
+
+class Redis(Action):
+    type: Literal["redis"] = "redis"
+    url: str = ""  # ? If url is set, its request is sent first (its response isn't checked)
+    redis_url: Optional[str] = None  # ? If redis_url is None, the REDIS_URL environment variable is used, else the redis_* settings of the stack
+    redis_pattern: str = "*"  # ? Keys that are counted and whose TTL is checked
+    min_keys: Optional[int] = None
+    max_keys: Optional[int] = None
+    min_ttl: Optional[float] = None  # ? TTL thresholds are in seconds, keys without a TTL respect min_ttl but not max_ttl
+    max_ttl: Optional[float] = None
+    min_hits: Optional[int] = None  # ? Keyspace hits and misses are the ones reported by INFO since its stats were reset
+    min_hit_ratio: Optional[float] = None
+    redis_reset_stats: bool = False  # ? If redis_reset_stats is True, the stats of INFO are reset after the check, so that the next one only sees what happened in between
+
+    @field_validator("min_hit_ratio")
+    @classmethod
+    def check_min_hit_ratio(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and not 0 <= v <= 1:
+            raise ValueError("min_hit_ratio must be between 0 and 1")
+        return v
+
+
+class Db(Action):
+    type: Literal["db"] = "db"
+    url: str = ""  # ? If url is set, its request is sent first (its response isn't checked)
+    database_uri: Optional[str] = None  # ? If database_uri is None, the DATABASE_URI environment variable is used, else the database_uri setting of the stack
+    query: str
+    min_rows: Optional[int] = None
+    max_rows: Optional[int] = None
+    row_rx: Optional[str] = None  # ? Regex that at least one row must match, its columns being joined by " | "
+    query_runs: int = 1  # ? Number of times the query is run, the median of the latencies is checked
+    max_query_latency: Optional[float] = None  # ? In milliseconds
+
+    @field_validator("row_rx")
+    @classmethod
+    def check_row_rx(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None:
+            match(v, "")
+        return v
+
+    @field_validator("query_runs")
+    @classmethod
+    def check_query_runs(cls, v: int) -> int:
+        if v < 1:
+            raise ValueError("query_runs must be at least 1")
+        return v
@@ -3,14 +3,16 @@
 
 from argparse import ArgumentParser
 from glob import glob
-from json import dumps
+from json import dumps, loads
 from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
 from os import getenv, sep
 from os.path import basename, join
+from re import sub
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Set, Tuple
 
-from yaml import safe_load
+from cache import load_yaml
+from slot import get_slot
 
 basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
 
@@ -26,8 +28,25 @@ parser = ArgumentParser(prog="Tests parser", description="Parse test files and r
 parser.add_argument("type", type=str, help="Type of test to parse", choices=["examples", "core", "ui"])
 parser.add_argument("--dev", action="store_true", help="Run in development mode")
 parser.add_argument("--category", type=str, help="Category of the test to parse actions from")
+parser.add_argument("--shards", type=int, help="Split the categories of each runner into this many shards of about the same duration")
+parser.add_argument(
+    "--durations",
+    type=str,
+    default=join(sep, "tmp", "tests", "durations.json"),
+    help='JSON file of recorded durations in seconds ({"category": 120, "Integration;category": 150}), used instead of the estimations when it exists',
+)
+parser.add_argument("--settings", type=str, help="Comma separated list of changed settings, only the tests using them are emitted")
+parser.add_argument("--changed-settings-file", type=str, help="File listing the changed settings (one per line), only the tests using them are emitted")
 ARGS = parser.parse_args()
 
+if ARGS.shards is not None and (ARGS.shards < 1 or ARGS.category):
+    LOGGER.error("--shards must be at least 1 and can't be used with --category")
+    exit(1)
+
+# ? Rough cost of starting a stack and of running a single check, in seconds, used to estimate the duration of a category
+STACK_START_COST = 60.0
+CHECK_COST = 1.0
+
 LOGGER.info(f"✂ Parsing {ARGS.type} tests{' in dev mode' if ARGS.dev else ''}{', only actions from category ' + ARGS.category if ARGS.category else ''}")
 LOGGER.debug(f"Arguments: {ARGS}")
 
@@ -35,7 +54,7 @@ integrations = {}
 if not ARGS.category:
     LOGGER.info("📖 Reading integrations.yml")
 
-    integrations = safe_load(Path("tests", "integrations.yml").read_text())["dev" if ARGS.dev else "staging"]
+    integrations = load_yaml(Path("tests", "integrations.yml"))["dev" if ARGS.dev else "staging"]
 
     LOGGER.debug(f"Integrations: {integrations}")
 
@@ -47,15 +66,102 @@ def check_integration(entry: List[str], data: dict) -> bool:
     return True
 
 
+def estimate_duration(integration: str, name: str, data: dict) -> float:
+    """Estimate how long the tests of a category take: a stack start per distinct config, plus the delay and duration of each action"""
+    configs = set()
+    duration = 0.0
+
+    for action_data in (data.get("actions") or {}).values():
+        action_data = action_data or {}
+        integration_data = action_data.get(integration.split(";")[0], {})
+        configs.add(dumps([action_data.get("config", {}), action_data.get("labels", {}), integration_data], sort_keys=True, default=str))
+
+        duration += float(integration_data.get("delay", action_data.get("delay", 30.0))) + CHECK_COST
+        if action_data.get("type") == "load":
+            duration += float(action_data.get("duration", 10.0))
+        elif action_data.get("type") == "rate":
+            duration += int(action_data.get("requests", 10)) / float(action_data.get("rate", 10.0)) + float(action_data.get("recovery_max") or 0)
+
+    return duration + STACK_START_COST * max(len(configs), 1)
+
+
+def get_setting_keys(key: str) -> Set[str]:
+    """Normalize a setting key: without the bunkerweb. label prefix, the server name prefix of multisite settings and the suffix
+    of multiple settings, so that REVERSE_PROXY_URL matches app1.example.com_REVERSE_PROXY_URL_1 for instance"""
+    key = key.replace("bunkerweb.", "", 1)
+    key = key.rsplit(".", 1)[-1].split("_", 1)[-1] if "." in key else key
+    key = key.upper()
+    return {key, sub(r"_\d+$", "", key)}
+
+
+def build_settings_index(categories: Dict[str, dict]) -> Dict[str, Dict[str, Set[str]]]:
+    """Build the inverted index of the settings used by the tests: setting -> category -> actions.
+
+    The settings set for the whole category (its config, labels and their integration overrides) are used by all its actions."""
+    index: Dict[str, Dict[str, Set[str]]] = {}
+
+    def add(settings: Iterable[str], name: str, actions: Iterable[str]):
+        for setting in settings:
+            for key in get_setting_keys(setting):
+                index.setdefault(key, {}).setdefault(name, set()).update(actions)
+
+    for name, data in categories.items():
+        actions = data.get("actions") or {}
+        overrides = [data.get(integration) or {} for integration in ("Docker", "Linux", "Autoconf", "Swarm", "Kubernetes")]
+
+        for section in [data] + overrides:
+            add(list(section.get("config") or {}) + list(section.get("labels") or {}), name, actions)
+
+        for action_str, action_data in actions.items():
+            action_data = action_data or {}
+            for section in [action_data] + [action_data.get(integration) or {} for integration in ("Docker", "Linux", "Autoconf", "Swarm", "Kubernetes")]:
+                add(list(section.get("config") or {}) + list(section.get("labels") or {}), name, [action_str])
+
+    return index
+
+
+def shard(entries: List[str], shards: int) -> List[str]:
+    """Split the categories of each runner into shards with a longest processing time first heuristic: each category, from the
+    longest to the shortest, goes to the shard with the lowest total duration so far"""
+    runners: Dict[str, List[str]] = {}
+    for entry in entries:
+        runner, name = entry.rsplit(";", 1)
+        runners.setdefault(runner, []).append(name)
+
+    sharded = []
+    for runner, names in runners.items():
+        integration = runner.split(";")[0]
+        costs = {name: durations.get(f"{integration};{name}", durations.get(name)) or estimate_duration(integration, name, categories[name]) for name in names}
+
+        bins: List[Tuple[float, List[str]]] = [(0.0, []) for _ in range(min(shards, len(names)))]
+        for name in sorted(names, key=lambda name: (-costs[name], name)):
+            index = min(range(len(bins)), key=lambda index: bins[index][0])
+            bins[index] = (bins[index][0] + costs[name], bins[index][1] + [name])
+
+        LOGGER.info(f"⚖ {runner.split(';')[0]} tests split in {len(bins)} shard(s) ({', '.join(f'~{int(load)}s' for load, _ in bins)})")
+        for load, names in bins:
+            LOGGER.debug(f"Shard of ~{int(load)}s: {', '.join(names)}")
+            sharded.append(f"{runner};{','.join(sorted(names))}")
+
+    return sharded
+
+
+durations: Dict[str, float] = {}
+if ARGS.shards and Path(ARGS.durations).is_file():
+    LOGGER.info(f"📖 Reading recorded durations from {ARGS.durations}")
+    durations = loads(Path(ARGS.durations).read_text())
+
 tests = []
+categories = {}
 if not ARGS.category:
     LOGGER.info("📖 Reading tests")
 
     for file in glob(join("tests", ARGS.type, "*.yml")):
         LOGGER.debug(f"Reading {file}")
-        data = safe_load(Path(file).read_text())
+        data = load_yaml(file)
         if data:
             name = basename(file).split(".")[0]
+            categories[name] = data
             test_integrations = data.get("integrations", [])
             LOGGER.debug(f"Integrations: {test_integrations}")
             if test_integrations == "all":
@@ -92,7 +198,7 @@ else:
     LOGGER.info(f"📖 Reading actions from category: {ARGS.category}")
     file_path = join("tests", ARGS.type, ARGS.category + ".yml")
     LOGGER.debug(f"Reading {file_path}")
-    data = safe_load(Path(file_path).read_text())
+    data = load_yaml(file_path)
     if data:
         for action in data.get("actions", []):
             tests.append(f"{ARGS.category};{action}")
@@ -105,11 +211,59 @@ LOGGER.debug(f"Tests: {tests}")
 
 LOGGER.info("📝 Writing tests files")
 
-tmp_path = Path(sep, "tmp", "tests")
+tmp_path = get_slot().tmp_path
 tmp_path.mkdir(parents=True, exist_ok=True)
 
+changed_settings = set()
+if ARGS.settings:
+    changed_settings.update(setting.strip() for setting in ARGS.settings.split(",") if setting.strip())
+if ARGS.changed_settings_file:
+    LOGGER.info(f"📖 Reading changed settings from {ARGS.changed_settings_file}")
+    changed_settings.update(line.split("#", 1)[0].strip() for line in Path(ARGS.changed_settings_file).read_text().splitlines() if line.split("#", 1)[0].strip())
+
+if ARGS.settings is not None or ARGS.changed_settings_file:
+    index = build_settings_index(categories if not ARGS.category else {ARGS.category: data})
+    LOGGER.debug(f"Settings index: { {setting: {name: sorted(actions) for name, actions in used.items()} for setting, used in index.items()} }")
+
+    affected: Dict[str, Set[str]] = {}
+    for setting in changed_settings:
+        for key in get_setting_keys(setting):
+            for name, actions in index.get(key, {}).items():
+                affected.setdefault(name, set()).update(actions)
+
+    LOGGER.info(f"🔎 {sum(len(actions) for actions in affected.values())} action(s) from {len(affected)} category(ies) use the changed settings: {', '.join(sorted(changed_settings))}")
+
+    selected = []
+    for test in tests:
+        runner, name = test.rsplit(";", 1)
+        if ARGS.category:
+            # ? In category mode, tests are "category;action"
+            if name in affected.get(runner, ()):
+                selected.append(test)
+        elif name in affected:
+            all_actions = set(categories[name].get("actions") or {})
+            # ? Only some actions of the category are affected: run them only, unless the categories are going to be sharded
+            if affected[name] == all_actions or ARGS.shards:
+                selected.append(test)
+            else:
+                selected.append(f"{test};{','.join(action for action in categories[name]['actions'] if action in affected[name])}")
+    tests = selected
+
+if ARGS.shards:
+    tests = shard(tests, ARGS.shards)
+
 if not ARGS.category:
     for integration in integrations:
         tmp_path.joinpath(f"{integration}_tests.json").write_text(dumps([test for test in tests if test.startswith(f"{integration};")]))
 else:
     tmp_path.joinpath("actions.txt").write_text("\n".join(tests) + "\n")
+
+    # ? Only needed when running the tests, so the models and their dependencies aren't required to list them
+    from compiled import PLAN_PATH, compile_plan, save_plan
+
+    LOGGER.info(f"🧩 Compiling the plan of {ARGS.category} to {PLAN_PATH}")
+
+    plan = compile_plan(ARGS.type, ARGS.category, data)
+    save_plan(plan)
+
+    LOGGER.info(f"✅ {len(plan['actions'])} / {len(plan['declared'])} action(s) compiled")
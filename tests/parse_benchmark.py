@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from glob import glob
+from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
+from os import getenv
+from os.path import join
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable, List
+
+from yaml import SafeLoader, load
+
+import cache
+from cache import load_yaml
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
+
+# Edit the default levels of the logging module
+addLevelName(DEBUG, "🐛")
+addLevelName(ERROR, "❌")
+addLevelName(INFO, "ℹ️ ")
+addLevelName(WARNING, "⚠️ ")
+
+LOGGER = getLogger("PARSE_BENCHMARK")
+
+parser = ArgumentParser(prog="Tests parse benchmark", description="Compare the cold and warm parse times of a tests tree.")
+parser.add_argument("type", type=str, nargs="?", default="core", help="Type of tests to parse", choices=["examples", "core", "ui"])
+parser.add_argument("--runs", type=int, default=5, help="Number of runs of each scenario, the median is reported")
+ARGS = parser.parse_args()
+
+files = sorted(glob(join("tests", ARGS.type, "*.yml"))) + [join("tests", "config.yml"), join("tests", "integrations.yml")]
+size = sum(Path(file).stat().st_size for file in files)
+
+LOGGER.info(f"⏱ Parsing {len(files)} files ({size / 1024:.1f} KiB) from tests/{ARGS.type}, {ARGS.runs} run(s) per scenario")
+
+
+def measure(parse: Callable[[str], object], before: Callable[[], None] = lambda: None) -> float:
+    """Median time taken to parse every file, in milliseconds"""
+    times: List[float] = []
+    for _ in range(ARGS.runs):
+        before()
+        start = perf_counter()
+        for file in files:
+            parse(file)
+        times.append((perf_counter() - start) * 1000)
+    return median(times)
+
+
+with TemporaryDirectory() as tmp_dir:
+    cache_path = Path(tmp_dir)
+
+    def reset_cache():
+        """Start from an empty cache, as the first run after a change of every file would"""
+        for cached in cache_path.glob("*.marshal"):
+            cached.unlink()
+        cache.LOADED.clear()
+
+    results = {
+        "Python loader, no cache": measure(lambda file: load(Path(file).read_bytes(), Loader=SafeLoader)),
+        f"{cache.SafeLoader.__name__}, cold cache": measure(lambda file: load_yaml(file, cache_path), reset_cache),
+        f"{cache.SafeLoader.__name__}, warm cache (new process)": measure(lambda file: load_yaml(file, cache_path), cache.LOADED.clear),
+        f"{cache.SafeLoader.__name__}, warm cache (same process)": measure(lambda file: load_yaml(file, cache_path)),
+    }
+
+baseline = results["Python loader, no cache"]
+for scenario, elapsed in results.items():
+    LOGGER.info(f"  - {scenario}: {elapsed:.2f} ms ({baseline / elapsed:.1f}x)")
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
+from os import getenv
+from os.path import join
+from typing import Any, Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from cache import load_yaml
+from compiled import load_plan
+from slot import get_slot
+from stack import PACKING_SERVERS, can_be_packed, get_base_config, get_config_hash, get_effective_config, get_effective_labels, get_packed_config
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
+
+# Edit the default levels of the logging module
+addLevelName(DEBUG, "🐛")
+addLevelName(ERROR, "❌")
+addLevelName(INFO, "ℹ️ ")
+addLevelName(WARNING, "⚠️ ")
+
+LOGGER = getLogger("PLAN")
+
+parser = ArgumentParser(prog="Tests planner", description="Group the actions sharing the same effective config so that the stack is only restarted between groups.")
+parser.add_argument("integration", type=str, help="Integration to test", choices=["Docker", "Linux", "Autoconf"])  # TODO: Add Swarm and Kubernetes
+parser.add_argument("type", type=str, help="Type of test to plan", choices=["examples", "core", "ui"])
+parser.add_argument("--keep-order", action="store_true", help="Only group consecutive actions, keeping the declaration order of the actions")
+parser.add_argument("--pack", action="store_true", help="Pack groups with conflicting configs on the same stack, each one on its own virtual host (multisite)")
+ARGS = parser.parse_args()
+
+tmp_path = get_slot().tmp_path
+actions_path = tmp_path.joinpath("actions.txt")
+
+LOGGER.info(f"📖 Reading {actions_path}")
+
+# ? Lines are "file;action", or "file;action1,action2" when parse.py selected only some actions of the file
+tests = [(line.split(";", 1)[0], action_str) for line in actions_path.read_text().splitlines() if line for action_str in line.split(";", 1)[1].split(",") if action_str]
+if not tests:
+    LOGGER.error(f"No actions found in {actions_path}")
+    exit(1)
+
+filename = tests[0][0]
+if any(test[0] != filename for test in tests):
+    LOGGER.error("All the actions must come from the same file")
+    exit(1)
+
+file_path = join("tests", ARGS.type, f"{filename}.yml")
+compiled_plan = load_plan(ARGS.type, filename)
+stacks = compiled_plan["stacks"].get(ARGS.integration, {}) if compiled_plan is not None else {}
+
+data = None
+base_config = None
+
+
+def get_action_stack(action_str: str) -> Tuple[str, Dict[str, Any], bool]:
+    """Return the config hash and config of an action and whether it can be packed, from the compiled plan if possible, else from the test file"""
+    global data, base_config
+
+    if action_str in stacks:
+        return stacks[action_str]["hash"], stacks[action_str]["config"], can_be_packed(compiled_plan["actions"][action_str])
+
+    if data is None:
+        LOGGER.info(f"📖 Reading {file_path}")
+        data = load_yaml(file_path)
+        base_config = get_base_config(ARGS.integration)
+
+    action_data = data.get("actions", {}).get(action_str, {})
+
+    if not action_data:
+        LOGGER.error(f"Action {action_str} not found in {filename}.yml")
+        exit(1)
+
+    try:
+        class_ = getattr(__import__("models"), action_data.get("type", "").title())
+        action = class_(**action_data)
+    except (AttributeError, ValidationError):
+        LOGGER.exception(f"Action {action_str} has invalid data")
+        exit(1)
+
+    config = get_effective_config(data, action, ARGS.integration, base_config)
+    return get_config_hash(config, get_effective_labels(data, action, ARGS.integration)), config, can_be_packed(action)
+
+
+LOGGER.info(f"🧮 Computing the effective config of {len(tests)} action(s) for integration {ARGS.integration}{' from the compiled plan' if stacks else ''}")
+
+# ? Groups are ordered by their first action, so each distinct config only costs a single restart
+groups: List[Tuple[str, List[str]]] = []
+configs: Dict[str, Dict[str, Any]] = {}
+packable: Dict[str, bool] = {}
+for _, action_str in tests:
+    config_hash, configs[action_str], packable[action_str] = get_action_stack(action_str)
+    LOGGER.debug(f"Action {action_str} has config hash {config_hash}")
+
+    candidates = groups[-1:] if ARGS.keep_order else groups
+    group = next((group for group in candidates if group[0] == config_hash), None)
+
+    if group is None:
+        groups.append((config_hash, [action_str]))
+    else:
+        group[1].append(action_str)
+
+# ? Each pack is a list of groups, started as a single multisite stack
+packs: List[List[List[str]]] = [[action_strs] for _, action_strs in groups]
+
+if ARGS.pack and ARGS.integration == "Autoconf":
+    LOGGER.warning("Autoconf stacks are configured with labels, their groups can't be packed")
+elif ARGS.pack:
+    packs = []
+    for _, action_strs in groups:
+        # ? Only the first group of a pack keeps the default server, so the groups that can't move can only start a pack
+        if all(packable[action_str] for action_str in action_strs):
+            candidates = packs[-1:] if ARGS.keep_order else packs
+            pack = next(
+                (
+                    pack
+                    for pack in candidates
+                    if len(pack) < len(PACKING_SERVERS) and get_packed_config([configs[group[0]] for group in pack] + [configs[action_strs[0]]]) is not None
+                ),
+                None,
+            )
+            if pack is not None:
+                pack.append(action_strs)
+                continue
+        packs.append([action_strs])
+
+plan = [f"{filename};{';'.join(','.join(action_strs) for action_strs in pack)}" for pack in packs]
+
+LOGGER.info(f"✅ {len(tests)} action(s) planned in {len(plan)} stack(s), saving {len(tests) - len(plan)} stack restart(s)")
+for test in plan:
+    LOGGER.info(f"  - {test}")
+
+LOGGER.info("📝 Writing groups file")
+
+tmp_path.joinpath("groups.txt").write_text("\n".join(plan) + "\n")
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from logging import getLogger
+from os import getenv
+from time import monotonic, sleep
+from typing import Any, Dict, Optional, Tuple
+
+from httpx import Client, HTTPError
+
+from slot import get_slot
+
+LOGGER = getLogger("RELOAD")
+
+# ? How long to wait for the core to acknowledge a reload, and how often to ask it
+RELOAD_TIMEOUT = 60.0
+RELOAD_POLL_INTERVAL = 0.5
+
+
+def get_core_api(config: Dict[str, Any]) -> Tuple[str, str]:
+    """Return the address the core API is reachable at from the tests runner, and its token.
+
+    The core_addr of the config is the one the BunkerWeb instances use, the runner reaches the core through its published port."""
+    return getenv("CORE_API_ADDR") or f"http://127.0.0.1:{get_slot().port(int(config['core'].get('listen_port', 1337)))}", config["global"]["core_token"]
+
+
+def get_setting_value(value: Any) -> Optional[str]:
+    """Format a value of the config.yml file as a BunkerWeb setting, None removes the setting"""
+    if value is None:
+        return None
+    elif isinstance(value, bool):
+        return "yes" if value else "no"
+    elif isinstance(value, list):
+        return " ".join(str(item) for item in value)
+    return str(value)
+
+
+def hot_reload(config: Dict[str, Any], diff: Dict[Tuple[str, str], Any], timeout: float = RELOAD_TIMEOUT) -> bool:
+    """Push the changed settings to the core API and wait for the reload to be acknowledged.
+
+    The core API is expected to answer:
+      - PATCH /config {"settings": {"SETTING": "value" | null}}
+      - POST /reload -> {"status": "success", "data": {"id": <reload id>}}
+      - GET /reload/<reload id> -> {"status": "success", "data": {"state": "pending" | "done" | "failed"}}
+
+    Returns False if the settings couldn't be applied, in which case the stack has to be restarted."""
+    addr, token = get_core_api(config)
+    settings = {key.upper(): get_setting_value(value) for (_, key), value in diff.items()}
+
+    LOGGER.info(f"🔁 Pushing {len(settings)} setting(s) to the core API at {addr}: {', '.join(settings)}")
+
+    try:
+        with Client(base_url=addr, headers={"Authorization": f"Bearer {token}"}, timeout=10.0) as client:
+            client.patch("/config", json={"settings": settings}).raise_for_status()
+
+            response = client.post("/reload")
+            response.raise_for_status()
+            reload_id = response.json()["data"]["id"]
+
+            # ? The state is read at least once, even with no time left to wait for it
+            start = monotonic()
+            while True:
+                response = client.get(f"/reload/{reload_id}")
+                response.raise_for_status()
+                state = response.json()["data"]["state"]
+
+                if state == "done":
+                    LOGGER.info(f"✅ Reload {reload_id} acknowledged after {monotonic() - start:.1f}s")
+                    return True
+                elif state == "failed":
+                    LOGGER.warning(f"Reload {reload_id} failed")
+                    return False
+                elif monotonic() - start >= timeout:
+                    break
+
+                sleep(RELOAD_POLL_INTERVAL)
+    except (HTTPError, KeyError, TypeError, ValueError) as e:
+        LOGGER.warning(f"Couldn't push the settings to the core API: {e}")
+        return False
+
+    LOGGER.warning(f"Reload {reload_id} wasn't acknowledged after {timeout}s")
+    return False
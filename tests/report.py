@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from json import JSONDecodeError, dumps, loads
+from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
+from os import getenv
+from pathlib import Path
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
+
+# Edit the default levels of the logging module
+addLevelName(DEBUG, "🐛")
+addLevelName(ERROR, "❌")
+addLevelName(INFO, "ℹ️ ")
+addLevelName(WARNING, "⚠️ ")
+
+LOGGER = getLogger("REPORT")
+
+parser = ArgumentParser(prog="Tests report", description="Merge the reports written by core.py for each group of a run into a single report.")
+parser.add_argument("reports", type=str, help="Directory of the reports of the groups (report-<index>.json)")
+parser.add_argument("output", type=str, help="Path of the merged report")
+ARGS = parser.parse_args()
+
+# ? The groups are merged in the order they were run
+paths = sorted(Path(ARGS.reports).glob("report-*.json"), key=lambda path: int(path.stem.split("-", 1)[1]))
+
+groups = []
+for path in paths:
+    try:
+        groups.append(loads(path.read_text()))
+    except JSONDecodeError:
+        LOGGER.warning(f"Skipping the invalid report {path}")
+
+actions = [action for group in groups for action in group["actions"]]
+report = {
+    "groups": groups,
+    "actions": len(actions),
+    "failed": sum(not action["passed"] for action in actions),
+    "duration": round(sum(action["duration"] for action in actions), 3),
+    "passed": all(group["passed"] for group in groups),
+}
+
+LOGGER.info(f"📝 Writing the report of {len(groups)} group(s) and {report['actions']} action(s) to {ARGS.output}")
+Path(ARGS.output).parent.mkdir(parents=True, exist_ok=True)
+Path(ARGS.output).write_text(dumps(report, indent=2))
@@ -23,90 +23,195 @@ elif [ -z "$category" ] ; then
 fi
 
 first_run=true
+custom_api_started=false
+redis_started=false
 
+# ? core.py writes the report of each group on its own, they are merged into report.json once the run is over
+reports_dir="$tmp_dir/reports"
+group_index=0
+rm -rf "$reports_dir"
+
+function merge_reports () {
+    if [ "$type" == "core" ] && [ -d "$reports_dir" ] ; then
+        python3 tests/report.py "$reports_dir" "$tmp_dir/report.json"
+    fi
+}
+
+# ? With PACK_STACKS=yes, groups of actions with conflicting settings share a stack, each one on its own virtual host
+plan_args=()
+if [ "$PACK_STACKS" == "yes" ] ; then
+    plan_args+=("--pack")
+fi
+
+# ? With CONVERGE=yes, core.py retries every check until it passes instead of waiting for its delay
+core_args=()
+if [ "$CONVERGE" == "yes" ] ; then
+    core_args+=("--converge")
+fi
+# ? With PARALLEL=<n>, core.py runs up to n actions of a group concurrently on its asyncio engine
+if [ -n "$PARALLEL" ] && [ "$PARALLEL" != "1" ] ; then
+    core_args+=("--parallel" "$PARALLEL")
+fi
+
+# ? With HOT_RELOAD=yes, the stack is reloaded through the core API between groups when only reloadable settings changed
+hot_reload=false
+if [ "$HOT_RELOAD" == "yes" ] && [ "$integration" != "Autoconf" ] ; then
+    hot_reload=true
+fi
+
+# ? A shard runs several categories one after the other on the same runner ("category1,category2")
 if [[ "$category" =~ ";" ]] ; then
-    mkdir -p /tmp/tests
-    echo "$category" > /tmp/tests/actions.txt
-    category=$(echo "$category" | cut -d ";" -f 1)
+    categories=("$category")
 else
-    if [ "$release" == "dev" ] || [ "$release" == "v2" ] ; then
-        python3 tests/parse.py "core" --category "$category" --dev
-    else
-        python3 tests/parse.py "core" --category "$category"
-    fi
+    IFS="," read -r -a categories <<< "$category"
 fi
 
-docker network create --subnet=10.20.30.0/24 --label "com.docker.compose.network=bw-universe" bw-universe
+if [ "$slot" != "0" ] && [ "$integration" != "Docker" ] ; then
+    echo "Only the Docker integration can run in slot $slot ❌"
+    exit 1
+fi
+
+if [ "$DNS_STANDIN" == "yes" ] && { [ "$slot" != "0" ] || [ "$integration" != "Docker" ] ; } ; then
+    echo "The DNS stand-in can only replace dnsmasq in the Docker stack of slot 0 ❌"
+    exit 1
+fi
+
+if [ "$UPSTREAM" == "yes" ] && { [ "$slot" != "0" ] || [ "$integration" != "Docker" ] ; } ; then
+    echo "The synthetic upstream can only be added to the Docker stack of slot 0 ❌"
+    exit 1
+fi
+
+docker network create --subnet="10.20.$((30 + slot)).0/24" --label "com.docker.compose.network=bw-universe" "bw-universe$suffix"
 # shellcheck disable=SC2181
 if [ $? -ne 0 ] ; then
-    echo "Failed to create bw-universe network ❌"
+    echo "Failed to create bw-universe$suffix network ❌"
     exit 1
 fi
 
-if grep -q "custom-api" tests/core/"$category".yml ; then
-    docker build -t custom-api -f tests/misc/api/Dockerfile tests/misc/api
-    # shellcheck disable=SC2181
-    if [ $? -ne 0 ] ; then
-        echo "Failed to build custom-api ❌"
-        exit 1
+for category in "${categories[@]}" ; do
+    echo "Running tests of category \"$category\" ..."
+
+    if [[ "$category" =~ ";" ]] ; then
+        mkdir -p "$tmp_dir"
+        echo "$category" > "$tmp_dir/actions.txt"
+        category=$(echo "$category" | cut -d ";" -f 1)
+    else
+        if [ "$release" == "dev" ] || [ "$release" == "v2" ] ; then
+            python3 tests/parse.py "core" --category "$category" --dev
+        else
+            python3 tests/parse.py "core" --category "$category"
+        fi
     fi
-    docker run -d --rm --name custom-api --network bw-universe --ip 10.20.30.30 -p 8000:8000 custom-api
+
+    python3 tests/plan.py "$integration" "$type" "${plan_args[@]}"
     # shellcheck disable=SC2181
     if [ $? -ne 0 ] ; then
-        echo "Failed to run custom-api ❌"
+        echo "Failed to plan the tests ❌"
         exit 1
     fi
-fi
-
-while read -r test ; do
-    echo "Generating test \"$test\" ..."
-
-    if ! $first_run ; then
-        cleanup_stack
 
-        if [ "$integration" == "Linux" ] ; then
-            sudo chown "$USER":"$USER" /etc/bunkerweb/config.yml
+    if ! $custom_api_started && grep -q "custom-api" tests/core/"$category".yml ; then
+        docker build -t custom-api -f tests/misc/api/Dockerfile tests/misc/api
+        # shellcheck disable=SC2181
+        if [ $? -ne 0 ] ; then
+            echo "Failed to build custom-api ❌"
+            exit 1
+        fi
+        docker run -d --rm --name "custom-api$suffix" --network "bw-universe$suffix" --network-alias custom-api --ip "10.20.$((30 + slot)).30" -p "$((8000 + 10000 * slot)):8000" custom-api
+        # shellcheck disable=SC2181
+        if [ $? -ne 0 ] ; then
+            echo "Failed to run custom-api ❌"
+            exit 1
         fi
+        custom_api_started=true
     fi
 
-    if [ "$release" == "dev" ] || [ "$release" == "v2" ] ; then
-        python3 tests/generate.py "$integration" "$type" "$test" --dev
-    else
-        python3 tests/generate.py "$integration" "$type" "$test"
+    # ? The redis actions need a server for BunkerWeb to use, published on the host where the Linux services reach it
+    if ! $redis_started && grep -q "type: redis" tests/core/"$category".yml ; then
+        docker run -d --rm --name "redis$suffix" -p "$((6379 + 10000 * slot)):6379" redis:7-alpine
+        # shellcheck disable=SC2181
+        if [ $? -ne 0 ] ; then
+            echo "Failed to run redis ❌"
+            exit 1
+        fi
+        redis_started=true
     fi
 
-    if [ "$integration" == "Linux" ] ; then
-        sudo chown nginx:nginx /etc/bunkerweb/config.yml
-    fi
+    while read -r test ; do
+        echo "Generating tests \"$test\" ..."
 
-    if $first_run && [ "$integration" == "Linux" ] ; then
-        sudo apt install -fy /tmp/bunkerweb.deb
-    else
-        ./tests/scripts/start.sh "$integration"
+        generate_args=()
+        if [ "$release" == "dev" ] || [ "$release" == "v2" ] ; then
+            generate_args+=("--dev")
+        fi
+
+        if ! $first_run ; then
+            # ? With hot reload, the stack is only stopped once generate.py knows the new config can't be reloaded
+            if $hot_reload ; then
+                generate_args+=("--reload")
+            else
+                cleanup_stack
+            fi
+
+            if [ "$integration" == "Linux" ] ; then
+                sudo chown "$USER":"$USER" /etc/bunkerweb/config.yml
+            fi
+        fi
+
+        python3 tests/generate.py "$integration" "$type" "$test" "${generate_args[@]}"
+
+        if [ "$integration" == "Linux" ] ; then
+            sudo chown nginx:nginx /etc/bunkerweb/config.yml
+        fi
+
+        if ! $first_run && $hot_reload && [ "$(cat "$tmp_dir/reload.txt")" == "reloaded" ] ; then
+            echo "Stack reloaded through the core API ♻"
+        elif $first_run && [ "$integration" == "Linux" ] ; then
+            sudo apt install -fy /tmp/bunkerweb.deb
+        else
+            if ! $first_run && $hot_reload ; then
+                cleanup_stack
+            fi
+
+            ./tests/scripts/start.sh "$integration"
+            ret=$?
+            # shellcheck disable=SC2181
+            if [ $ret -ne 0 ] ; then
+                exit $ret
+            fi
+        fi
+
+        ./tests/scripts/wait.sh "$integration"
         ret=$?
         # shellcheck disable=SC2181
         if [ $ret -ne 0 ] ; then
             exit $ret
         fi
-    fi
 
-    ./tests/scripts/wait.sh "$integration"
-    ret=$?
-    # shellcheck disable=SC2181
-    if [ $ret -ne 0 ] ; then
-        exit $ret
-    fi
+        # ? The database of the Linux services belongs to the bunkerweb user, the db actions read it (and its WAL files) as the runner user
+        if [ "$integration" == "Linux" ] && grep -q "type: db" tests/core/"$category".yml ; then
+            sudo setfacl -R -m "u:$USER:rwX" -m "d:u:$USER:rwX" /var/lib/bunkerweb
+        fi
 
-	python3 "tests/$type.py" "$test"
-    # shellcheck disable=SC2181
-    if [ $? -ne 0 ] ; then
-        echo "Test \"$test\" failed ❌"
-        exit 1
-    fi
+        if [ "$type" == "core" ] ; then
+            group_index=$((group_index+1))
+            python3 tests/core.py "$(echo "$test" | cut -d ";" -f 1)" --batch --actions "$(echo "$test" | cut -d ";" -f 2-)" --integration "$integration" --report "$reports_dir/report-$group_index.json" "${core_args[@]}"
+        else
+            python3 "tests/$type.py" "$test"
+        fi
+        # shellcheck disable=SC2181
+        if [ $? -ne 0 ] ; then
+            merge_reports
+            echo "Tests \"$test\" failed ❌"
+            exit 1
+        fi
+
+        echo "Tests \"$test\" passed ✅"
 
-    echo "Test \"$test\" passed ✅"
+        first_run=false
+    done < "$tmp_dir/groups.txt"
+done
 
-    first_run=false
-done < "/tmp/tests/actions.txt"
+merge_reports
 
 echo "All tests passed ✅"
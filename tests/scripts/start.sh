@@ -9,24 +9,24 @@ echo "Building BunkerWeb stack for integration \"$integration\" ..."
 
 # Starting stack
 if [ "$integration" == "Docker" ] ; then
-    docker compose -f tests/docker-compose.yml pull
+    docker compose "${compose_args[@]}" pull
     # shellcheck disable=SC2181
     if [ $? -ne 0 ] ; then
         echo "Pull failed ❌"
         exit 1
     fi
-    docker compose -f tests/docker-compose.yml build
+    docker compose "${compose_args[@]}" build
     # shellcheck disable=SC2181
     if [ $? -ne 0 ] ; then
         echo "Build failed ❌"
         exit 1
     fi
-    docker compose -f tests/docker-compose.yml up -d
+    docker compose "${compose_args[@]}" up -d
     # shellcheck disable=SC2181
     if [ $? -ne 0 ] ; then
         echo "Up failed, retrying ... ⚠️"
         cleanup_stack
-        docker compose -f tests/docker-compose.yml up -d
+        docker compose "${compose_args[@]}" up -d
         # shellcheck disable=SC2181
         if [ $? -ne 0 ] ; then
             echo "Up failed ❌"
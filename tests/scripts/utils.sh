@@ -11,13 +11,37 @@ elif [ "$integration" != "Docker" ] && [ "$integration" != "Linux" ] && [ "$inte
     exit 1
 fi
 
+# ? Slots other than 0 are isolated Docker stacks running side by side on the same host (see tests/slot.py and tests/slots.py)
+slot=${SLOT:-0}
+if [ "$slot" == "0" ] ; then
+    suffix=""
+    tmp_dir="/tmp/tests"
+    compose_file="tests/docker-compose.yml"
+    timeout_file="/tmp/timeout.txt"
+else
+    suffix="-$slot"
+    tmp_dir="/tmp/tests/slot-$slot"
+    compose_file="$tmp_dir/docker-compose.yml"
+    timeout_file="$tmp_dir/timeout.txt"
+fi
+
+compose_args=(-f "$compose_file")
+# ? With DNS_STANDIN=yes, dnsmasq is replaced by the programmable DNS responder, its HTTP API is published on port 8053
+if [ "$DNS_STANDIN" == "yes" ] ; then
+    compose_args+=(-f tests/docker-compose.dns.yml)
+fi
+# ? With UPSTREAM=yes, the synthetic upstream is started too, it is published on port 8088
+if [ "$UPSTREAM" == "yes" ] ; then
+    compose_args+=(-f tests/docker-compose.upstream.yml)
+fi
+
 function cleanup_stack () {
     exit_code=$?
     echo "Cleaning up current stack ..."
 
     if [ "$integration" == "Docker" ] || [ "$integration" == "Autoconf" ] ; then
         if [ "$integration" == "Docker" ] ; then
-            docker compose -f tests/docker-compose.yml down -v --remove-orphans
+            docker compose "${compose_args[@]}" down -v --remove-orphans
             # shellcheck disable=SC2181
             if [ $? -ne 0 ] ; then
                 echo "Failed to stop BunkerWeb stack ❌"
@@ -60,20 +84,23 @@ function cleanup_stack () {
         sudo truncate -s 0 /var/log/bunkerweb/core-access.log
     fi
 
+    # ? The positions the log actions read the logs from are only valid for the stack they were read from
+    rm -f "$tmp_dir/log-positions.json"
+
     if [ -f geckodriver.log ] ; then
         sudo rm -f geckodriver.log
     fi
 
     if [ "$exit_code" == 1 ] || ($trapped && [ "$exit_code" == 0 ] && [ "$(basename "$0")" == "run.sh" ]) ; then
-        if docker ps -a -f "name=custom-api" | grep -q "custom-api" ; then
-            docker stop custom-api
+        if docker ps -a -f "name=custom-api$suffix" | grep -qE " custom-api$suffix\$" ; then
+            docker stop "custom-api$suffix"
             # shellcheck disable=SC2181
             if [ $? -ne 0 ] ; then
                 echo "Failed to remove custom-api container ❌"
                 return 1
             fi
-        elif docker container ls -a -f "name=custom-api" | grep -q "custom-api" ; then
-            docker container rm -f custom-api
+        elif docker container ls -a -f "name=custom-api$suffix" | grep -qE " custom-api$suffix\$" ; then
+            docker container rm -f "custom-api$suffix"
             # shellcheck disable=SC2181
             if [ $? -ne 0 ] ; then
                 echo "Failed to remove custom-api container ❌"
@@ -81,8 +108,17 @@ function cleanup_stack () {
             fi
         fi
 
-        if docker network ls -q -f "name=bw-universe" ; then
-            docker network rm -f bw-universe
+        if docker ps -a -f "name=redis$suffix" | grep -qE " redis$suffix\$" ; then
+            docker stop "redis$suffix"
+            # shellcheck disable=SC2181
+            if [ $? -ne 0 ] ; then
+                echo "Failed to remove redis container ❌"
+                return 1
+            fi
+        fi
+
+        if docker network ls -q -f "name=bw-universe$suffix" ; then
+            docker network rm -f "bw-universe$suffix"
             # shellcheck disable=SC2181
             if [ $? -ne 0 ] ; then
                 echo "Failed to remove bw-universe network ❌"
@@ -98,8 +134,8 @@ function log_stack () {
     echo "Showing BunkerWeb and BunkerWeb Core logs ..."
 
     if [ "$integration" == "Docker" ] || [ "$integration" == "Autoconf" ] ; then
-        docker logs bunkerweb
-        docker logs bw-core
+        docker logs "bunkerweb$suffix"
+        docker logs "bw-core$suffix"
         if [ "$integration" == "Autoconf" ] ; then
             docker logs bw-autoconf
         fi
@@ -117,9 +153,9 @@ function log_stack () {
         sudo cat /var/log/bunkerweb/core-access.log
     fi
 
-    if docker ps -a -f "name=custom-api" | grep -q "custom-api" ; then
+    if docker ps -a -f "name=custom-api$suffix" | grep -qE " custom-api$suffix\$" ; then
         echo "Showing custom-api logs ..."
-        docker logs custom-api
+        docker logs "custom-api$suffix"
     fi
 
     if [ -f geckodriver.log ] ; then
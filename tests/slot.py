@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from os import getenv, sep
+from pathlib import Path
+from re import sub
+from typing import Any
+from urllib.parse import urlsplit, urlunsplit
+
+from cache import load_yaml
+
+# ? Published ports are shifted by this much per slot, so 6 slots fit below port 65535
+PORT_OFFSET = 10000
+MAX_SLOTS = 6
+TESTS_PATH = Path(__file__).parent.resolve()
+
+
+class Slot:
+    """Parameters of an isolated tests stack: slot 0 is the historical stack, the other ones have their own subnets, container and
+    network names, published ports and working directory so that several of them can run side by side on the same host"""
+
+    def __init__(self, index: int):
+        if not 0 <= index < MAX_SLOTS:
+            raise ValueError(f"Slot must be between 0 and {MAX_SLOTS - 1}")
+        self.index = index
+
+    @property
+    def suffix(self) -> str:
+        """Suffix of the container and network names"""
+        return f"-{self.index}" if self.index else ""
+
+    @property
+    def tmp_path(self) -> Path:
+        return Path(sep, "tmp", "tests", *([f"slot-{self.index}"] if self.index else []))
+
+    @property
+    def config_path(self) -> Path:
+        return Path(sep, "etc", "bunkerweb", "config.yml") if not self.index else self.tmp_path.joinpath("config.yml")
+
+    @property
+    def timeout_path(self) -> Path:
+        return Path(sep, "tmp", "timeout.txt") if not self.index else self.tmp_path.joinpath("timeout.txt")
+
+    def port(self, port: int) -> int:
+        """Host port a port of the stack is published on"""
+        return port + PORT_OFFSET * self.index
+
+    def rewrite(self, value: Any) -> Any:
+        """Move the addresses of the bw-universe (10.20.30.0/24) and bw-services (192.168.0.0/24) networks to the ones of the slot"""
+        if isinstance(value, dict):
+            return {key: self.rewrite(item) for key, item in value.items()}
+        elif isinstance(value, list):
+            return [self.rewrite(item) for item in value]
+        elif not isinstance(value, str) or not self.index:
+            return value
+        return sub(r"\b192\.168\.0\.(?=\d)", f"192.168.{self.index}.", sub(r"\b10\.20\.30\.(?=\d)", f"10.20.{30 + self.index}.", value))
+
+    def rewrite_url(self, url: str) -> str:
+        """Point a URL of the tests, served on the default ports of the host, to the ports the slot is published on"""
+        split = urlsplit(url)
+        if not self.index or split.port is not None or split.hostname is None:
+            return url
+        return urlunsplit(split._replace(netloc=f"{split.netloc}:{self.port(443 if split.scheme == 'https' else 80)}"))
+
+    def get_compose(self, path: Path) -> dict:
+        """Render a compose file of the tests for the slot"""
+        compose = load_yaml(path)
+
+        for name, service in compose.get("services", {}).items():
+            service["container_name"] = service.get("container_name", name) + self.suffix
+            service["ports"] = [f"{self.port(int(host))}:{container}" for host, container in (port.split(":", 1) for port in service.get("ports", []))]
+            if not service["ports"]:
+                del service["ports"]
+
+            volumes = []
+            for volume in service.get("volumes", []):
+                source, target = volume.split(":", 1)
+                if source == "/etc/bunkerweb/config.yml":
+                    source = self.config_path.as_posix()
+                elif source.startswith("./"):
+                    # ? Relative to the compose file, which isn't in tests/ anymore, and the files having addresses are rendered too
+                    source = TESTS_PATH.joinpath(source).as_posix()
+                    if source.endswith(".hosts"):
+                        rendered = self.tmp_path.joinpath(Path(source).name)
+                        rendered.write_text(self.rewrite(Path(source).read_text()))
+                        source = rendered.as_posix()
+                volumes.append(f"{source}:{target}")
+            if volumes:
+                service["volumes"] = volumes
+
+            if isinstance(service.get("build"), dict) and service["build"].get("context", "").startswith("./"):
+                service["build"]["context"] = TESTS_PATH.joinpath(service["build"]["context"]).as_posix()
+
+            for key in ("environment", "networks"):
+                if key in service:
+                    service[key] = self.rewrite(service[key])
+
+        for name, network in compose.get("networks", {}).items():
+            network["name"] = network.get("name", name) + self.suffix
+            if "ipam" in network:
+                network["ipam"] = self.rewrite(network["ipam"])
+
+        return compose
+
+
+def get_slot() -> Slot:
+    """Slot of the current process, from the SLOT environment variable set by the slots runner (0 if unset)"""
+    return Slot(int(getenv("SLOT", "0") or 0))
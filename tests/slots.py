@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from asyncio import Queue, create_subprocess_exec, gather, run
+from asyncio.subprocess import STDOUT
+from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
+from os import cpu_count, environ, getenv
+from time import monotonic
+from typing import List
+
+from slot import MAX_SLOTS, Slot
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
+
+# Edit the default levels of the logging module
+addLevelName(DEBUG, "🐛")
+addLevelName(ERROR, "❌")
+addLevelName(INFO, "ℹ️ ")
+addLevelName(WARNING, "⚠️ ")
+
+LOGGER = getLogger("SLOTS")
+
+parser = ArgumentParser(prog="Tests slots runner", description="Run the tests of several categories concurrently, each one in an isolated stack slot.")
+parser.add_argument("integration", type=str, help="Integration to test", choices=["Docker"])
+parser.add_argument("type", type=str, help="Type of test to run", choices=["core"])
+parser.add_argument("release", type=str, help="Release to test")
+parser.add_argument("categories", type=str, nargs="+", help='Categories to run (as accepted by run.sh: "category", "category1,category2" or "category;action1,action2")')
+parser.add_argument(
+    "--slots",
+    type=int,
+    default=max(1, min(MAX_SLOTS, (cpu_count() or 1) // 4)),
+    help=f"Number of stacks run concurrently, at most {MAX_SLOTS} (default: one per 4 CPUs)",
+)
+ARGS = parser.parse_args()
+
+if not 1 <= ARGS.slots <= MAX_SLOTS:
+    LOGGER.error(f"--slots must be between 1 and {MAX_SLOTS}")
+    exit(1)
+
+
+async def run_slot(slot: Slot, queue: Queue, results: List[dict]):
+    """Run the categories of the queue one after the other in a slot, until the queue is empty"""
+    slot.tmp_path.mkdir(parents=True, exist_ok=True)
+    log_path = slot.tmp_path.joinpath("run.log")
+
+    while not queue.empty():
+        category = queue.get_nowait()
+        LOGGER.info(f"🚀 Running {category} in slot {slot.index} (logs in {log_path})")
+
+        start = monotonic()
+        with log_path.open("ab") as log:
+            process = await create_subprocess_exec(
+                "tests/scripts/run.sh", ARGS.integration, ARGS.type, ARGS.release, category, stdout=log, stderr=STDOUT, env=environ | {"SLOT": str(slot.index)}
+            )
+            passed = await process.wait() == 0
+
+        results.append({"category": category, "slot": slot.index, "passed": passed, "duration": round(monotonic() - start, 3)})
+        if passed:
+            LOGGER.info(f"✅ {category} passed in slot {slot.index} ({monotonic() - start:.0f}s)")
+        else:
+            LOGGER.error(f"{category} failed in slot {slot.index}, see {log_path}")
+
+
+async def main() -> List[dict]:
+    queue = Queue()
+    for category in ARGS.categories:
+        queue.put_nowait(category)
+
+    results: List[dict] = []
+    slots = min(ARGS.slots, len(ARGS.categories))
+    LOGGER.info(f"🧩 Running {len(ARGS.categories)} category(ies) in {slots} slot(s)")
+
+    await gather(*(run_slot(Slot(index), queue, results) for index in range(slots)))
+    return results
+
+
+start = monotonic()
+results = run(main())
+failed = [result["category"] for result in results if not result["passed"]]
+
+LOGGER.info(f"⏱ {len(results)} category(ies) run in {monotonic() - start:.0f}s, {sum(result['duration'] for result in results):.0f}s of sequential run time")
+
+if failed:
+    LOGGER.error(f"{len(failed)} category(ies) failed: {', '.join(failed)}")
+    exit(1)
+
+LOGGER.info("✅ All categories passed")
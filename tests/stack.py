@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from copy import deepcopy
+from hashlib import sha256
+from json import dumps
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from cache import load_yaml
+from models import Action
+
+LOGGER = getLogger("STACK")
+
+DEFAULT_AUTOCONF_SERVICES = {
+    "version": "3.5",
+    "services": {
+        "app1": {
+            "image": "nginxdemos/nginx-hello:0.2",
+            "networks": {
+                "bw-services": {
+                    "ipv4_address": "192.168.0.254",
+                    "aliases": ["app1"],
+                }
+            },
+        }
+    },
+    "networks": {
+        "bw-services": {
+            "external": True,
+        },
+    },
+}
+
+
+def get_base_config(integration: str) -> Dict[str, Any]:
+    """Read tests/config.yml and apply the integration specific defaults"""
+    config = load_yaml(Path("tests", "config.yml"))
+
+    if integration != "Linux":
+        config["core"]["listen_addr"] = "0.0.0.0"
+        config["core"]["whitelist"] = "10.20.30.0/24"
+        config["core"]["bunkerweb_instances"] = ["10.20.30.254"]
+
+    if integration == "Autoconf":
+        config["core"]["autoconf_mode"] = True
+        config["core"]["server_name"] = ""
+        config["core"]["multisite"] = True
+
+    return config
+
+
+def get_effective_config(data: dict, action: Action, integration: str, base_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Compute the config.yml content of an action: test_config | action.config | integration.config on top of the defaults"""
+    config = deepcopy(base_config) if base_config is not None else get_base_config(integration)
+
+    test_config = data.get("config", {}) | data.get(integration, {}).get("config", {})
+    for key, value in (test_config | action.config | getattr(action, integration).config).items():
+        config["core"][key.lower()] = value
+
+    return config
+
+
+def get_effective_labels(data: dict, action: Action, integration: str) -> Dict[str, str]:
+    """Compute the Autoconf labels of an action, empty for the other integrations"""
+    if integration != "Autoconf":
+        return {}
+
+    test_labels = data.get("labels", {}) | data.get(integration, {}).get("labels", {})
+    return {f"bunkerweb.{key.replace('bunkerweb.', '', 1).upper()}": value for key, value in (test_labels | action.labels | getattr(action, integration).labels).items()}
+
+
+def get_autoconf_services(labels: Dict[str, str]) -> Dict[str, Any]:
+    """Build the Autoconf services compose file with the given labels"""
+    autoconf_path = Path("tests", "misc", "autoconf-services.yml")
+    autoconf = load_yaml(autoconf_path) if autoconf_path.is_file() else deepcopy(DEFAULT_AUTOCONF_SERVICES)
+
+    if "labels" not in autoconf["services"]["app1"]:
+        autoconf["services"]["app1"]["labels"] = {}
+    autoconf["services"]["app1"]["labels"].update(labels)
+
+    return autoconf
+
+
+def get_config_hash(config: Dict[str, Any], labels: Dict[str, str]) -> str:
+    """Hash an effective config and its labels, two actions with the same hash can share a stack"""
+    return sha256(dumps({"config": config, "labels": labels}, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ? Virtual hosts served by the tests stacks, the actions are written against the first one
+PACKING_SERVERS = ("www.example.com", "app1.example.com", "app2.example.com", "app3.example.com")
+# ? Keys of the core section that configure the core itself rather than BunkerWeb
+CORE_KEYS = {"autoconf_mode", "bunkerweb_instances", "check_token", "check_whitelist", "listen_addr", "listen_port", "whitelist"}
+# ? BunkerWeb settings that can only be set globally, on top of the ones downloading lists (*_URLS)
+GLOBAL_SETTINGS = {
+    "api_whitelist_ip",
+    "bunkernet_server",
+    "database_uri",
+    "datastore_memory_size",
+    "deny_http_status",
+    "disable_default_server",
+    "dns_resolvers",
+    "http_port",
+    "https_port",
+    "kubernetes_mode",
+    "log_level",
+    "multisite",
+    "redis_host",
+    "redis_port",
+    "server_name",
+    "sessions_absolute_timeout",
+    "sessions_check_ip",
+    "sessions_check_user_agent",
+    "sessions_idle_timeout",
+    "sessions_name",
+    "sessions_secret",
+    "swarm_mode",
+    "use_redis",
+    "workers",
+}
+
+
+def can_be_packed(action: Action) -> bool:
+    """Whether an action can be moved to another virtual host: it must target the default one, not check its certificate and not
+    read the logs, the cache or the database, which are shared by every virtual host"""
+    return action.type not in ("ssl", "log", "redis", "db") and urlsplit(action.url).hostname == PACKING_SERVERS[0]
+
+
+def get_packed_config(configs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Merge the effective configs of up to len(PACKING_SERVERS) stacks in a single multisite config, one server per config.
+
+    The settings having the same value in every config stay global, the other ones are prefixed with the server name of their
+    config. Returns None when the configs can't be packed: too many of them, a global setting that differs or a multisite config."""
+    if len(configs) > len(PACKING_SERVERS):
+        return None
+
+    for config in configs:
+        if config["core"].get("server_name") != PACKING_SERVERS[0] or str(config["core"].get("multisite", "no")).lower() in ("yes", "true"):
+            return None
+
+    packed = deepcopy(configs[0])
+    packed["core"] = {}
+
+    for key in dict.fromkeys(key for config in configs for key in config["core"]):
+        values = [config["core"].get(key, KeyError) for config in configs]
+        if all(value == values[0] for value in values):
+            packed["core"][key] = values[0]
+            continue
+        elif key in CORE_KEYS or key in GLOBAL_SETTINGS or key.endswith("_urls"):
+            LOGGER.debug(f"Can't pack configs with different values of {key}: {values}")
+            return None
+
+        for server, config in zip(PACKING_SERVERS, configs):
+            if key in config["core"]:
+                packed["core"][f"{server}_{key}"] = config["core"][key]
+
+    packed["core"]["multisite"] = "yes"
+    packed["core"]["server_name"] = " ".join(PACKING_SERVERS[: len(configs)])
+    return packed
+
+
+# ? Settings that are only read when the stack starts, changing them needs a full restart instead of a reload
+RESTART_SETTINGS = CORE_KEYS | {"database_uri", "datastore_memory_size", "http_port", "https_port", "redis_host", "redis_port", "use_redis", "workers"}
+
+
+def get_config_diff(previous: Dict[str, Any], config: Dict[str, Any]) -> Dict[Tuple[str, str], Any]:
+    """Return the (section, key) of every setting that changed between two configs with its new value, None if it was removed"""
+    diff = {}
+    for section in dict.fromkeys(list(previous) + list(config)):
+        old, new = previous.get(section) or {}, config.get(section) or {}
+        for key in dict.fromkeys(list(old) + list(new)):
+            if old.get(key, KeyError) != new.get(key, KeyError):
+                diff[(section, key)] = new.get(key)
+    return diff
+
+
+def needs_restart(diff: Dict[Tuple[str, str], Any]) -> bool:
+    """Whether the stack must be restarted to apply a config diff: only the BunkerWeb settings of the core section can be reloaded"""
+    return any(section != "core" or key in RESTART_SETTINGS for section, key in diff)
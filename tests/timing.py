@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from json import dumps
+from pathlib import Path
+from socket import socket
+from threading import Lock
+from time import perf_counter, time
+from typing import Any, Dict, List, Optional, Tuple
+
+from httpx import Request, Response
+
+JSONL_LOCK = Lock()
+
+
+class RequestTracer:
+    """Collect the timing breakdown of a request (and of its redirects) from httpcore's trace events.
+
+    httpcore resolves the host inside connect_tcp without a trace event of its own, so the DNS lookup can't be told apart: the
+    connect time includes the name resolution."""
+
+    def __init__(self):
+        self.hops: List[Dict[str, float]] = [{}]
+        self.network_stream = None
+
+    def _record(self, event_name: str, info: Dict[str, Any]):
+        # ? http11.receive_response_headers.complete and http2.receive_response_headers.complete are the same step
+        name = event_name.split(".", 1)[1] if event_name.startswith(("http11.", "http2.")) else event_name
+        self.hops[-1][name] = perf_counter()
+
+        if name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and info.get("return_value") is not None:
+            self.network_stream = info["return_value"]
+
+        if name == "response_closed.complete":
+            self.hops.append({})
+
+    def __call__(self, event_name: str, info: Dict[str, Any]):
+        self._record(event_name, info)
+
+    async def trace_async(self, event_name: str, info: Dict[str, Any]):
+        """Async version of the trace callback, as the async transports await it"""
+        self._record(event_name, info)
+
+    def get_socket(self) -> Optional[socket]:
+        """Socket of the last connection opened for the request, None if it reused a pooled connection"""
+        return self.network_stream.get_extra_info("socket") if self.network_stream is not None else None
+
+    def samples(self) -> List[Dict[str, Optional[float]]]:
+        """Timing breakdown of every hop, in milliseconds, None when the step didn't happen (reused connection, plain HTTP, ...)"""
+
+        def duration(events: Dict[str, float], start: str, end: str) -> Optional[float]:
+            if start in events and end in events:
+                return round((events[end] - events[start]) * 1000, 3)
+            return None
+
+        samples = []
+        for events in self.hops:
+            if not events:
+                continue
+
+            samples.append(
+                {
+                    "connect": duration(events, "connection.connect_tcp.started", "connection.connect_tcp.complete"),
+                    "tls_handshake": duration(events, "connection.start_tls.started", "connection.start_tls.complete"),
+                    "ttfb": duration(events, "send_request_headers.started", "receive_response_headers.complete"),
+                    "transfer": duration(events, "receive_response_body.started", "receive_response_body.complete"),
+                    "total": round((max(events.values()) - min(events.values())) * 1000, 3),
+                }
+            )
+        return samples
+
+
+def get_bytes(request: Request, response: Optional[Response]) -> Tuple[int, int]:
+    """Approximate the bytes sent and received on the wire (request/status lines, headers and raw body, without TLS overhead)"""
+    sent = len(request.method) + len(request.url.raw_path) + 12 + sum(len(key) + len(value) + 4 for key, value in request.headers.raw) + 2
+    sent += int(request.headers.get("content-length", 0))
+
+    received = 0
+    if response is not None:
+        received = len(response.http_version) + len(response.reason_phrase) + 7 + sum(len(key) + len(value) + 4 for key, value in response.headers.raw) + 2
+        received += response.num_bytes_downloaded
+    return sent, received
+
+
+def write_samples(path: Path, tracer: RequestTracer, request: Request, response: Optional[Response], error: Optional[str] = None, **context: Any):
+    """Append the samples of a traced request to a JSONL file, along with the given context (category, action, integration, ...)"""
+    responses = (response.history + [response]) if response is not None else []
+    samples = tracer.samples()
+    lines = []
+
+    for index, sample in enumerate(samples):
+        hop_response = responses[index] if index < len(responses) else None
+        hop_request = hop_response.request if hop_response is not None else request
+        bytes_sent, bytes_received = get_bytes(hop_request, hop_response)
+
+        lines.append(
+            dumps(
+                context
+                | {
+                    "timestamp": time(),
+                    "hop": index,
+                    "method": hop_request.method,
+                    "url": str(hop_request.url),
+                    "http_version": hop_response.http_version if hop_response is not None else None,
+                    "status": hop_response.status_code if hop_response is not None else None,
+                    "error": error if hop_response is None else None,
+                    "bytes_sent": bytes_sent,
+                    "bytes_received": bytes_received,
+                }
+                | sample
+            )
+        )
+
+    if not lines:
+        return
+
+    with JSONL_LOCK:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as file:
+            file.write("\n".join(lines) + "\n")
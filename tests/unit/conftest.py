@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# ? Unit tests of the tests harness itself: python3 -m pytest tests/unit
+from os import environ
+from pathlib import Path
+from shutil import rmtree
+from subprocess import CompletedProcess, run
+from sys import executable, path
+from typing import Dict
+
+import pytest
+
+ROOT_PATH = Path(__file__).parents[2]
+TESTS_PATH = ROOT_PATH.joinpath("tests")
+path.insert(0, TESTS_PATH.as_posix())
+
+# ? The scripts are run in their own slot, so that they don't touch the files of a stack being tested
+UNIT_SLOT = 5
+
+
+@pytest.fixture
+def slot_env():
+    """Environment running the harness scripts in the slot of the unit tests, whose directory is removed afterwards"""
+    from slot import Slot
+
+    slot = Slot(UNIT_SLOT)
+    slot.tmp_path.mkdir(parents=True, exist_ok=True)
+    yield environ | {"SLOT": str(UNIT_SLOT)}
+    rmtree(slot.tmp_path, ignore_errors=True)
+
+
+def run_script(script: str, *args: str, env: Dict[str, str]) -> CompletedProcess:
+    """Run a script of the harness from the root of the repository, like the workflows do"""
+    return run([executable, f"tests/{script}", *args], cwd=ROOT_PATH, env=env, capture_output=True, text=True)
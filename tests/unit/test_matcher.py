@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from random import Random
+
+import pytest
+
+from matcher import MAX_FIND_PATTERNS, BodyMatcher
+
+
+def feed(matcher: BodyMatcher, body: str, sizes: Random):
+    offset = 0
+    while offset < len(body):
+        size = sizes.randint(1, 7)
+        matcher.feed(body[offset : offset + size])
+        offset += size
+
+
+@pytest.mark.parametrize("count", [1, 3, MAX_FIND_PATTERNS + 4])
+def test_literals_spanning_chunks(count):
+    rand = Random(count)
+    patterns = [f"needle-{index}-" + "x" * index for index in range(count)]
+    body = "".join(rand.choice("abcx-") for _ in range(2000))
+    present = patterns[::2]
+    for pattern in present:
+        position = rand.randrange(len(body))
+        body = body[:position] + pattern + body[position:]
+
+    matcher = BodyMatcher(patterns[: count // 2 + 1], patterns[count // 2 + 1 :])
+    feed(matcher, body, rand)
+
+    assert matcher.missing == [pattern for pattern in patterns[: count // 2 + 1] if pattern not in body]
+    assert matcher.forbidden_found == [pattern for pattern in patterns[count // 2 + 1 :] if pattern in body]
+
+
+def test_regexes_and_done():
+    matcher = BodyMatcher(["Hello"], required_rx=[r"World \d+"])
+    for chunk in ("He", "llo Wor", "ld 4", "2"):
+        matcher.feed(chunk)
+    assert matcher.missing == [] and matcher.done
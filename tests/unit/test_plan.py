@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from json import loads
+
+from conftest import UNIT_SLOT, run_script
+from slot import Slot
+
+SETTINGS = "SSL_PROTOCOLS,REDIRECT_HTTP_TO_HTTPS,AUTO_REDIRECT_HTTP_TO_HTTPS,DISABLE_DEFAULT_SERVER"
+
+
+def test_selected_actions_are_planned(slot_env):
+    tmp_path = Slot(UNIT_SLOT).tmp_path
+
+    result = run_script("parse.py", "core", "--settings", SETTINGS, env=slot_env)
+    assert result.returncode == 0, result.stderr
+    tests = loads(tmp_path.joinpath("Docker_tests.json").read_text())
+    assert tests
+
+    for test in tests:
+        # ? The workflow passes "category;action1,action2" to run.sh, which writes it as is to actions.txt
+        category, actions = test.split(";")[-2:]
+        assert "," in actions
+        tmp_path.joinpath("actions.txt").write_text(f"{category};{actions}\n")
+
+        result = run_script("plan.py", "Docker", "core", env=slot_env)
+        assert result.returncode == 0, result.stderr
+
+        planned = [action_str for line in tmp_path.joinpath("groups.txt").read_text().splitlines() for group in line.split(";")[1:] for action_str in group.split(",")]
+        assert sorted(planned) == sorted(actions.split(","))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from copy import deepcopy
+from importlib.util import module_from_spec, spec_from_file_location
+
+import pytest
+from fastapi.testclient import TestClient
+
+import reload
+from conftest import TESTS_PATH
+from stack import get_config_diff, needs_restart
+
+CONFIG = {
+    "global": {"core_token": "S3cr3tT0k3n!"},
+    "core": {"listen_port": 1337, "server_name": "www.example.com", "http_port": 80, "log_level": "info", "use_gzip": False},
+}
+
+
+@pytest.fixture
+def core_api(monkeypatch):
+    """Fresh instance of the fake core API, hot_reload talking to it in process"""
+
+    def load(failing_settings: str = ""):
+        monkeypatch.setenv("RELOAD_DELAY", "0")
+        monkeypatch.setenv("FAILING_SETTINGS", failing_settings)
+        spec = spec_from_file_location("core_api", TESTS_PATH.joinpath("misc", "core-api", "main.py"))
+        module = module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        monkeypatch.setattr(reload, "RELOAD_POLL_INTERVAL", 0)
+        monkeypatch.setattr(reload, "Client", lambda base_url, headers, timeout: TestClient(module.app, base_url=base_url, headers=headers))
+        return module
+
+    return load
+
+
+def get_new_config(**settings) -> dict:
+    config = deepcopy(CONFIG)
+    config["core"].update(settings)
+    for key in [key for key, value in settings.items() if value is None]:
+        del config["core"][key]
+    return config
+
+
+def test_reloadable_diff_is_applied(core_api):
+    api = core_api()
+    config = get_new_config(log_level="debug", use_gzip=True, use_brotli="yes", server_name=None)
+    diff = get_config_diff(CONFIG, config)
+
+    assert diff == {("core", "log_level"): "debug", ("core", "use_gzip"): True, ("core", "use_brotli"): "yes", ("core", "server_name"): None}
+    assert not needs_restart(diff)
+    assert reload.hot_reload(config, diff)
+    assert api.settings == {"LOG_LEVEL": "debug", "USE_GZIP": "yes", "USE_BROTLI": "yes"}
+    assert list(api.reloads.values()) == ["done"]
+
+
+@pytest.mark.parametrize("settings", [{"http_port": 8080}, {"listen_port": 1338}, {"log_level": "debug", "use_redis": "yes"}])
+def test_restart_settings_are_reported(settings):
+    assert needs_restart(get_config_diff(CONFIG, get_new_config(**settings)))
+
+
+def test_other_sections_need_a_restart():
+    config = deepcopy(CONFIG)
+    config["global"]["core_token"] = "other"
+    assert needs_restart(get_config_diff(CONFIG, config))
+
+
+def test_failed_reload(core_api):
+    api = core_api("USE_BROTLI")
+    config = get_new_config(use_brotli="yes")
+
+    assert not reload.hot_reload(config, get_config_diff(CONFIG, config))
+    assert list(api.reloads.values()) == ["failed"]
+
+
+def test_invalid_token(core_api):
+    core_api()
+    config = get_new_config(log_level="debug")
+    config["global"]["core_token"] = "invalid"
+
+    assert not reload.hot_reload(config, get_config_diff(CONFIG, config))
+
+
+@pytest.mark.parametrize("timeout", [0, -1])
+def test_reload_is_checked_without_timeout(core_api, timeout):
+    api = core_api()
+    config = get_new_config(log_level="debug")
+
+    assert reload.hot_reload(config, get_config_diff(CONFIG, config), timeout=timeout)
+    assert list(api.reloads.values()) == ["done"]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# ? The db and redis actions of tests/core, run by core.py against a temporary database and a local Redis server
+from os import getenv
+from socket import create_connection
+from sqlite3 import connect
+from urllib.parse import urlparse
+
+import pytest
+
+from conftest import run_script
+
+REDIS_URL = getenv("REDIS_URL", "redis://127.0.0.1:6379/15")
+
+
+def redis_available() -> bool:
+    url = urlparse(REDIS_URL)
+    try:
+        create_connection((url.hostname or "127.0.0.1", url.port or 6379), timeout=1).close()
+    except OSError:
+        return False
+    return True
+
+
+@pytest.fixture
+def database_uri(tmp_path) -> str:
+    """sqlite database holding the tables of BunkerWeb the db actions query"""
+    database_path = tmp_path.joinpath("db.sqlite")
+    with connect(database_path) as database:
+        database.execute("CREATE TABLE bw_services (id TEXT PRIMARY KEY, method TEXT)")
+        database.execute("CREATE TABLE bw_settings (id TEXT PRIMARY KEY, name TEXT, context TEXT, `default` TEXT)")
+        database.execute("INSERT INTO bw_services VALUES ('www.example.com', 'scheduler')")
+        database.execute("INSERT INTO bw_settings VALUES ('USE_REDIS', 'Use Redis', 'global', 'no')")
+    return f"sqlite:///{database_path.as_posix()}"
+
+
+def test_db_actions(slot_env, database_uri):
+    result = run_script("core.py", "db", "--batch", env=slot_env | {"DATABASE_URI": database_uri})
+    assert result.returncode == 0, result.stderr
+    assert "A row matches" in result.stderr
+
+
+@pytest.mark.skipif(not redis_available(), reason=f"No Redis server at {REDIS_URL}")
+def test_redis_actions(slot_env):
+    from redis import Redis
+
+    client = Redis.from_url(REDIS_URL, decode_responses=True)
+    client.flushdb()
+    client.set("unit_test", "cached", ex=60)
+    client.get("unit_test")  # ? A keyspace hit for cache_hits
+
+    try:
+        # ? requests_sent needs the stack, the checks are run on their own so that the suite doesn't send any request
+        result = run_script("core.py", "redis", "--batch", "--actions", "keys_stored,cache_hits", env=slot_env | {"REDIS_URL": REDIS_URL})
+        assert result.returncode == 0, result.stderr
+    finally:
+        client.flushdb()
+        client.close()
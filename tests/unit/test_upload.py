@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# ? Uploads rejected by a server that closes the connection without reading the body, with both engines of core.py
+from socket import socket
+from threading import Thread
+
+import pytest
+
+from conftest import TESTS_PATH, run_script
+
+REJECTED_BODY_LENGTH = 5 * 1024 * 1024
+
+
+def reject(connection: socket):
+    with connection:
+        data = b""
+        while b"\r\n\r\n" not in data and (chunk := connection.recv(65536)):
+            data += chunk
+        connection.sendall(b"HTTP/1.1 413 Request Entity Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
+
+@pytest.fixture
+def rejecting_server():
+    """Server answering 413 as soon as it has the request headers, then closing the connection with the body still being sent"""
+    server = socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:  # ? The server was closed
+                return
+            Thread(target=reject, args=(connection,), daemon=True).start()
+
+    Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/"
+    server.close()
+
+
+@pytest.fixture
+def upload_category(rejecting_server):
+    """Test file of two uploads expecting a 413, they only exist while the test runs as core.py reads them from tests/core"""
+    file_path = TESTS_PATH.joinpath("core", "unit-upload.yml")
+    action = f'    type: status\n    url: "{rejecting_server}"\n    method: POST\n    body_length: {REJECTED_BODY_LENGTH}\n    status: 413\n    delay: 0\n'
+    file_path.write_text(f"integrations: all\nactions:\n  first:\n{action}  second:\n{action}")
+    yield file_path.stem
+    file_path.unlink()
+
+
+@pytest.mark.parametrize("parallel", ["1", "4"])
+def test_rejected_upload(slot_env, upload_category, parallel):
+    result = run_script("core.py", upload_category, "--batch", "--parallel", parallel, env=slot_env)
+    assert result.returncode == 0, result.stderr
+    assert result.stderr.count("Status code 413 found") == 2
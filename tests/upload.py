@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from select import select
+from socket import socket
+from time import perf_counter
+from typing import Callable, Dict, Iterator, Optional
+
+# ? Every chunk of a generated body is this same buffer, only the last one is a (smaller) copy of it
+BODY_CHUNK_SIZE = 65536
+BODY_CHUNK = b"a" * BODY_CHUNK_SIZE
+
+
+class BodyStream:
+    """Request body made of the letter "a" repeated length times, generated chunk by chunk instead of being allocated up front.
+
+    It keeps track of how much of it the transport consumed, and can be iterated again if a redirect needs the body to be resent.
+    Given the socket it is sent on, it also notes when the server started answering, as the body is still sent after that."""
+
+    def __init__(self, length: int, get_socket: Optional[Callable[[], Optional[socket]]] = None):
+        self.length = length
+        self.get_socket = get_socket
+        self.sent = 0
+        self.answered_at: Optional[int] = None  # ? Bytes sent when the server started answering, i.e. when it rejected the body
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+
+    def _chunks(self) -> Iterator[bytes]:
+        self.sent = 0
+        self.answered_at = None
+        self.started = perf_counter()
+        self.ended = None
+
+        remaining = self.length
+        while remaining > 0:
+            if self.answered_at is None and self.get_socket is not None and (sock := self.get_socket()) is not None and select([sock], [], [], 0)[0]:
+                self.answered_at = self.sent
+            chunk = BODY_CHUNK if remaining >= BODY_CHUNK_SIZE else BODY_CHUNK[:remaining]
+            yield chunk
+            # ? Only counted once the transport asks for the next chunk, i.e. once this one was written
+            self.sent += len(chunk)
+            remaining -= len(chunk)
+
+        self.ended = perf_counter()
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self._chunks()
+
+    @property
+    def complete(self) -> bool:
+        return self.sent >= self.length
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Upload throughput in bytes per second, until the body was fully sent or the upload stopped"""
+        if self.started is None:
+            return None
+        elapsed = (self.ended or perf_counter()) - self.started
+        return self.sent / elapsed if elapsed > 0 else None
+
+    def get_headers(self, chunked: bool) -> Dict[str, str]:
+        """Headers announcing the body, without a Content-Length the body is sent with the chunked transfer encoding"""
+        return {} if chunked else {"Content-Length": str(self.length)}
+
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from argparse import ArgumentParser
+from asyncio import FIRST_COMPLETED, Queue, TimeoutError as AsyncTimeoutError, create_subprocess_exec, gather, get_running_loop, run, sleep, to_thread, wait, wait_for
+from asyncio.subprocess import DEVNULL, PIPE
+from json import dumps
+from logging import DEBUG, ERROR, INFO, WARNING, addLevelName, basicConfig, getLogger
+from os import getenv
+from random import uniform
+from time import monotonic, time
+from typing import Dict, List
+
+from httpx import AsyncClient, HTTPError
+
+from slot import get_slot
+
+basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]", level=DEBUG if getenv("ACTIONS_STEP_DEBUG", False) else INFO)
+
+# Edit the default levels of the logging module
+addLevelName(DEBUG, "🐛")
+addLevelName(ERROR, "❌")
+addLevelName(INFO, "ℹ️ ")
+addLevelName(WARNING, "⚠️ ")
+
+LOGGER = getLogger("WAIT")
+
+parser = ArgumentParser(prog="Tests stack readiness", description="Wait for the stack to be ready, reacting to Docker events or to the logs of the Linux services.")
+parser.add_argument("integration", type=str, help="Integration to wait for", choices=["Docker", "Linux", "Autoconf"])  # TODO: Add Swarm and Kubernetes
+parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the stack to be ready, every phase included")
+ARGS = parser.parse_args()
+
+# ? Exit code asking wait.sh to restart the Linux services before waiting again
+RESTART_EXIT_CODE = 2
+# ? Backoff of the HTTP probe, doubled after each failed attempt and jittered so that the slots don't probe in lockstep
+PROBE_BACKOFF = 0.1
+PROBE_MAX_BACKOFF = 2.0
+LINUX_READY_LINE = "BunkerWeb is ready"
+LINUX_FAILED_LINE = "SYSTEMCTL - ❌ "
+
+SLOT = get_slot()
+phases: Dict[str, float] = {}
+
+
+class RestartNeeded(Exception):
+    pass
+
+
+async def wait_containers(containers: List[str], deadline: float):
+    """Wait for every container to be healthy: their current state is checked concurrently, then only the health events are awaited"""
+    from docker import from_env  # ? Only needed for the Docker based integrations
+    from docker.errors import NotFound
+
+    client = from_env()
+    loop = get_running_loop()
+    events: Queue = Queue()
+
+    # ? Subscribed to before the state is checked, so that no transition can be missed in between
+    stream = client.events(since=int(time()) - 1, filters={"type": "container", "event": ["health_status", "die"]}, decode=True)
+
+    def forward_events():
+        try:
+            for event in stream:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+        except Exception:  # ? The stream raises when it is closed
+            pass
+
+    forwarder = loop.run_in_executor(None, forward_events)
+    start = monotonic()
+
+    async def get_health(container: str) -> str:
+        try:
+            attrs = (await to_thread(client.containers.get, container)).attrs
+        except NotFound:
+            return "missing"
+        return attrs["State"].get("Health", {}).get("Status", "healthy" if attrs["State"].get("Running") else "exited")
+
+    try:
+        pending = set()
+        for container, health in zip(containers, await gather(*(get_health(container) for container in containers))):
+            LOGGER.debug(f"Container {container} is {health}")
+            if health == "healthy":
+                phases[f"container_{container}"] = round(monotonic() - start, 3)
+            else:
+                pending.add(container)
+
+        while pending:
+            event = await wait_for(events.get(), max(deadline - monotonic(), 0.001))
+            container = event.get("Actor", {}).get("Attributes", {}).get("name", "")
+            if container not in pending:
+                continue
+            elif event.get("status") == "die":
+                raise RuntimeError(f"Container {container} exited while the stack was starting")
+            elif event.get("status", "").endswith(": healthy"):
+                phases[f"container_{container}"] = round(monotonic() - start, 3)
+                pending.discard(container)
+                LOGGER.info(f"✅ Container {container} is healthy")
+    finally:
+        stream.close()
+        await forwarder
+        client.close()
+
+    phases["containers"] = round(monotonic() - start, 3)
+
+
+async def follow(command: List[str], line: str, deadline: float) -> bool:
+    """Read the output of a command until a line containing the given text shows up, return False if the deadline is reached first"""
+    process = await create_subprocess_exec(*command, stdout=PIPE, stderr=DEVNULL)
+    try:
+        while True:
+            output = await wait_for(process.stdout.readline(), max(deadline - monotonic(), 0.001))
+            if not output:
+                return False
+            if line in output.decode(errors="replace"):
+                return True
+    except AsyncTimeoutError:
+        return False
+    finally:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+
+
+async def wait_services(deadline: float):
+    """Wait for the Linux services to be ready, from their logs: the error log says when BunkerWeb is ready, the journal when it failed"""
+    start = monotonic()
+    ready = get_running_loop().create_task(follow(["sudo", "tail", "-n", "+1", "-F", "/var/log/bunkerweb/error.log"], LINUX_READY_LINE, deadline))
+    failed = get_running_loop().create_task(follow(["sudo", "journalctl", "-u", "bunkerweb", "-f", "-n", "all", "-o", "cat", "--no-pager"], LINUX_FAILED_LINE, deadline))
+
+    try:
+        while not ready.done():
+            await wait({ready, failed} - ({failed} if failed.done() else set()), return_when=FIRST_COMPLETED)
+            if failed.done() and failed.result():
+                raise RestartNeeded()
+        if not ready.result():
+            raise AsyncTimeoutError()
+        # ? The journal may not have been read up to the ready line yet
+        if await follow(["sudo", "journalctl", "-u", "bunkerweb", "-o", "cat", "--no-pager"], LINUX_FAILED_LINE, deadline):
+            raise RestartNeeded()
+    finally:
+        for task in (ready, failed):
+            task.cancel()
+        await gather(ready, failed, return_exceptions=True)
+
+    phases["services"] = round(monotonic() - start, 3)
+
+
+async def probe(deadline: float):
+    """Confirm that BunkerWeb answers on its real listeners: any answer but a 503 means that its configuration is loaded"""
+    start = monotonic()
+    backoff = PROBE_BACKOFF
+    attempts = 0
+    urls = [f"http://www.example.com:{SLOT.port(80)}/", f"https://www.example.com:{SLOT.port(443)}/"]
+
+    async with AsyncClient(verify=False, timeout=2.0) as client:
+        while True:
+            attempts += 1
+            for url in urls:
+                try:
+                    response = await client.get(url)
+                except HTTPError as e:
+                    LOGGER.debug(f"Probe of {url} failed: {e}")
+                    continue
+                if response.status_code != 503:
+                    phases["probe"] = round(monotonic() - start, 3)
+                    LOGGER.info(f"✅ BunkerWeb answered {response.status_code} on {url} after {attempts} attempt(s)")
+                    return
+                LOGGER.debug(f"Probe of {url} answered {response.status_code}")
+
+            if monotonic() + backoff > deadline:
+                raise AsyncTimeoutError()
+            await sleep(backoff * uniform(0.5, 1.5))
+            backoff = min(backoff * 2, PROBE_MAX_BACKOFF)
+
+
+async def main() -> int:
+    start = monotonic()
+    deadline = start + ARGS.timeout
+
+    try:
+        if ARGS.integration == "Linux":
+            LOGGER.info("⏳ Waiting for the BunkerWeb services to be ready ...")
+            await wait_services(deadline)
+        else:
+            containers = ["bunkerweb", "bw-core", "bw-autoconf"] if ARGS.integration == "Autoconf" else [f"bunkerweb{SLOT.suffix}", f"bw-core{SLOT.suffix}"]
+            LOGGER.info(f"⏳ Waiting for containers {', '.join(containers)} to be healthy ...")
+            await wait_containers(containers, deadline)
+
+        LOGGER.info("⏳ Probing BunkerWeb ...")
+        await probe(deadline)
+    except RestartNeeded:
+        LOGGER.warning("BunkerWeb failed to start, it needs to be restarted")
+        return RESTART_EXIT_CODE
+    except AsyncTimeoutError:
+        LOGGER.error(f"Stack is not ready after {ARGS.timeout}s (phases done: {phases})")
+        return 1
+    except RuntimeError as e:
+        LOGGER.error(str(e))
+        return 1
+    finally:
+        phases["total"] = round(monotonic() - start, 3)
+        SLOT.tmp_path.mkdir(parents=True, exist_ok=True)
+        with SLOT.tmp_path.joinpath("readiness.jsonl").open("a") as readiness:
+            readiness.write(dumps({"integration": ARGS.integration, "time": time(), "phases": phases}) + "\n")
+
+    LOGGER.info(f"✅ Stack is ready after {phases['total']}s ({', '.join(f'{phase}: {duration}s' for phase, duration in phases.items() if phase != 'total')})")
+    return 0
+
+
+exit(run(main()))